@@ -0,0 +1,73 @@
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = timedelta(minutes=1)
+JOB_LEASE = timedelta(minutes=30)
+
+
+def enqueue(name, **kwargs):
+    """Ставит в очередь вызов функции name (путь для импорта) с kwargs.
+
+    Запись идёт в текущей транзакции: воркер увидит задачу только после
+    коммита. Такая же задача, ещё ждущая очереди, второй раз не ставится.
+    """
+    payload = json.dumps(kwargs, sort_keys=True)
+    job, _ = Job.objects.get_or_create(
+        name=name, payload=payload, status=Job.PENDING)
+    return job
+
+
+def claim_jobs(limit):
+    """Забирает до limit готовых задач, возвращает их id.
+
+    Задачу получает тот воркер, чей UPDATE первым сменил её статус.
+    Задача, взятая дольше JOB_LEASE назад, считается брошенной упавшим
+    воркером и забирается снова, пока не кончатся попытки.
+    """
+    now = timezone.now()
+    stale = Q(status=Job.RUNNING, claimed_at__lt=now - JOB_LEASE)
+    Job.objects.filter(stale, attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED, error='Воркер не завершил задачу.')
+    claimable = Q(status=Job.PENDING, run_after__lte=now) | stale
+    candidates = Job.objects.filter(claimable).values_list(
+        'pk', flat=True)[:limit]
+    claimed = []
+    for job_id in candidates:
+        if Job.objects.filter(claimable, pk=job_id).update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            claimed_at=now,
+        ):
+            claimed.append(job_id)
+    return claimed
+
+
+def run_job(job_id):
+    """Выполняет забранную задачу и записывает результат."""
+    job = Job.objects.get(pk=job_id)
+    try:
+        import_string(job.name)(**json.loads(job.payload))
+    except Exception:
+        logger.exception('Задача %s #%s упала', job.name, job.pk)
+        job.error = traceback.format_exc()
+        if job.attempts < JOB_MAX_ATTEMPTS:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + JOB_RETRY_DELAY * job.attempts
+        else:
+            job.status = Job.FAILED
+    else:
+        job.status = Job.DONE
+        job.error = ''
+    job.save(update_fields=['status', 'run_after', 'error'])
+    return job.status
@@ -0,0 +1,51 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.jobs import claim_jobs, run_job
+from core.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи из очереди в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число процессов, 0 — выполнять в текущем процессе')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и выйти')
+
+    def handle(self, *args, **options):
+        pool = None
+        if options['workers']:
+            pool = ProcessPoolExecutor(options['workers'])
+        done = 0
+        try:
+            while True:
+                job_ids = claim_jobs(options['batch_size'])
+                if job_ids:
+                    if pool is None:
+                        statuses = [run_job(job_id) for job_id in job_ids]
+                    else:
+                        # Соединения не переживают fork: процессы пула
+                        # открывают свои, родитель переподключится сам.
+                        connections.close_all()
+                        statuses = list(pool.map(run_job, job_ids))
+                    done += statuses.count(Job.DONE)
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(f'Выполнено задач: {done}')
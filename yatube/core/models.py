@@ -0,0 +1,42 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Фоновая задача, которую выполняет команда run_jobs."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    payload = models.TextField('Аргументы', default='{}')
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    run_after = models.DateTimeField('Не раньше', default=timezone.now)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    claimed_at = models.DateTimeField('Взята воркером', null=True, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+
+    class Meta:
+        ordering = ['run_after']
+        verbose_name_plural = 'Задачи'
+        verbose_name = 'Задача'
+        indexes = [
+            models.Index(
+                fields=['status', 'run_after'], name='job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
@@ -0,0 +1,71 @@
+import logging
+from functools import wraps
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """Считает SQL-запросы соединения по умолчанию внутри with-блока."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+
+def query_budget(max_queries):
+    """Ограничивает число SQL-запросов, которые делает view.
+
+    При превышении пишет предупреждение в лог, а с включённой настройкой
+    QUERY_BUDGET_STRICT выбрасывает QueryBudgetExceeded.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with QueryCounter() as counter:
+                response = view(request, *args, **kwargs)
+            if counter.count > max_queries:
+                message = (
+                    f'{view.__module__}.{view.__name__}: {counter.count} '
+                    f'SQL-запросов при бюджете {max_queries} '
+                    f'({request.method} {request.get_full_path()})'
+                )
+                if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
+
+
+class QueryBudgetTestMixin:
+    """Проверка в тестах, что view укладывается в свой бюджет запросов."""
+
+    def assertWithinQueryBudget(self, client, url, method='get', data=None):
+        view = resolve(urlsplit(url).path).func
+        self.assertIsNotNone(
+            getattr(view, 'query_budget', None),
+            f'Для {url} не задан бюджет запросов')
+        with override_settings(QUERY_BUDGET_STRICT=True):
+            return getattr(client, method)(url, data)
@@ -0,0 +1,193 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.encoding import escape_uri_path
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+# Имя из sha256 содержимого (и ширины копии) не меняется при жизни файла.
+HASHED_MEDIA = re.compile(r'(?:^|/)([0-9a-f]{64}(?:_\d+)?)\.\w+$')
+# Имена статики после collectstatic: style.0123456789ab.css.
+HASHED_STATIC = re.compile(r'\.([0-9a-f]{12})\.\w+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MEDIA_CACHE_CONTROL = 'public, max-age=3600'
+STATIC_CACHE_CONTROL = 'public, max-age=600'
+# Сжатые заранее копии в порядке предпочтения.
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+BYTES_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+def file_etag(path, stat, hashed):
+    """Сильный ETag из хеша в имени файла, иначе слабый из mtime и размера."""
+    match = hashed.search(path)
+    if match:
+        return quote_etag(match.group(1))
+    return f'W/"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """Один диапазон Range как (start, end) включительно.
+
+    None — отдать файл целиком (заголовка нет или он не разобран,
+    несколько диапазонов тоже отдаются целиком), ValueError — диапазон
+    вне файла.
+    """
+    match = BYTES_RANGE.match(header or '')
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if not length:
+            raise ValueError('Пустой диапазон')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('Диапазон вне файла')
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    """If-Range: диапазон действует, только если файл не поменялся."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return not etag.startswith('W/') and if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.partition(';')
+        quality = params.replace(' ', '').lower()
+        if quality.startswith('q=') and not quality[2:].strip('0.'):
+            continue  # q=0: кодировка явно запрещена
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def pick_precompressed(request, full_path):
+    """Сжатая копия рядом с файлом, которую примет клиент."""
+    accepted = accepted_encodings(request)
+    for coding, suffix in PRECOMPRESSED:
+        if coding in accepted and os.path.isfile(full_path + suffix):
+            return coding, full_path + suffix
+    return None, full_path
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as file_:
+        file_.seek(start)
+        while length:
+            data = file_.read(min(BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def delegated_response(path, full_path, content_type):
+    """Ответ без тела: файл отдаёт фронтовой веб-сервер."""
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response['X-Accel-Redirect'] = escape_uri_path(
+            settings.MEDIA_ACCEL_REDIRECT.rstrip('/') + '/' + path)
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+def file_response(request, body_path, size, content_type, etag,
+                  last_modified):
+    byte_range = None
+    if range_applies(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    if byte_range is None:
+        return FileResponse(open(body_path, 'rb'), content_type=content_type)
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        read_range(body_path, start, end - start + 1),
+        status=206,
+        content_type=content_type,
+    )
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def serve_file(request, root, path, hashed, cache_control,
+               precompressed=False, delegate=False):
+    """Отдаёт файл из root с ETag, Range и долгим кэшем для хеш-имён."""
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    encoding, body_path = None, full_path
+    if precompressed:
+        encoding, body_path = pick_precompressed(request, full_path)
+    stat = os.stat(body_path)
+    etag = file_etag(path, stat, hashed)
+    if encoding:
+        etag = f'{etag[:-1]}-{encoding}"'
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content_type = mimetypes.guess_type(full_path)[0]
+        content_type = content_type or 'application/octet-stream'
+        if delegate and (
+            settings.MEDIA_ACCEL_REDIRECT or settings.MEDIA_X_SENDFILE
+        ):
+            response = delegated_response(path, full_path, content_type)
+        else:
+            response = file_response(
+                request, body_path, stat.st_size, content_type, etag,
+                last_modified)
+        response['Accept-Ranges'] = 'bytes'
+        if encoding:
+            response['Content-Encoding'] = encoding
+    if precompressed:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = (
+        IMMUTABLE_CACHE_CONTROL if hashed.search(path) else cache_control)
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Раздаёт MEDIA_ROOT.
+
+    С MEDIA_ACCEL_REDIRECT или MEDIA_X_SENDFILE сам файл отдаёт
+    фронтовой веб-сервер, Django только проверяет путь и ставит заголовки.
+    """
+    return serve_file(
+        request, settings.MEDIA_ROOT, path, HASHED_MEDIA,
+        MEDIA_CACHE_CONTROL, delegate=True)
+
+
+@require_safe
+def serve_static(request, path):
+    """Раздаёт STATIC_ROOT, выбирая .br или .gz по Accept-Encoding."""
+    return serve_file(
+        request, settings.STATIC_ROOT, path, HASHED_STATIC,
+        STATIC_CACHE_CONTROL, precompressed=True)
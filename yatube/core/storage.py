@@ -0,0 +1,39 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # без пакета Brotli раздаются только .gz
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml', '.ico')
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем в имени и сжатыми копиями .gz и .br рядом."""
+
+    # Файл, которого нет в манифесте, хешируется по содержимому.
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as file_:
+            data = file_.read()
+        packed = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            packed['.br'] = brotli.compress(data)
+        for suffix, content in packed.items():
+            if len(content) < len(data):
+                with open(path + suffix, 'wb') as file_:
+                    file_.write(content)
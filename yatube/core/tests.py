@@ -1,6 +1,33 @@
+import gzip
+import os
+import shutil
+import tempfile
 from http import HTTPStatus
+from io import StringIO
 
-from django.test import Client, TestCase
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from core import storage as storage_module
+from core.jobs import JOB_LEASE, JOB_MAX_ATTEMPTS, claim_jobs, enqueue
+from core.models import Job
+from core.serving import IMMUTABLE_CACHE_CONTROL
+
+CALLS = []
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_STATIC_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_STATIC_SOURCE = tempfile.mkdtemp(dir=settings.BASE_DIR)
+HASHED_NAME = f'posts/ab/cd/{"ab" * 32}.gif'
+
+
+def remember(value):
+    CALLS.append(value)
+
+
+def explode():
+    raise RuntimeError('Сбой задачи')
 
 
 class ViewTestClass(TestCase):
@@ -11,3 +38,214 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def run_jobs(self):
+        out = StringIO()
+        call_command('run_jobs', once=True, workers=0, stdout=out)
+        return out.getvalue()
+
+    def test_enqueue_skips_duplicates(self):
+        """Одинаковая задача в очереди ставится один раз."""
+        first = enqueue('core.tests.remember', value=1)
+        second = enqueue('core.tests.remember', value=1)
+        self.assertEqual(first, second)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_run_jobs_executes_queue(self):
+        """run_jobs выполняет задачи и отмечает их выполненными."""
+        enqueue('core.tests.remember', value=1)
+        enqueue('core.tests.remember', value=2)
+        self.assertIn('Выполнено задач: 2', self.run_jobs())
+        self.assertEqual(sorted(CALLS), [1, 2])
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+
+    def test_claimed_job_not_claimed_again(self):
+        """Забранную задачу другой воркер не получит."""
+        job = enqueue('core.tests.remember', value=1)
+        self.assertEqual(claim_jobs(10), [job.pk])
+        self.assertEqual(claim_jobs(10), [])
+
+    def test_abandoned_job_claimed_again(self):
+        """Задачу, брошенную воркером, после аренды забирают снова."""
+        job = enqueue('core.tests.remember', value=1)
+        claim_jobs(10)
+        expired = timezone.now() - JOB_LEASE * 2
+        Job.objects.filter(pk=job.pk).update(claimed_at=expired)
+        self.assertEqual(claim_jobs(10), [job.pk])
+        Job.objects.filter(pk=job.pk).update(
+            claimed_at=expired, attempts=JOB_MAX_ATTEMPTS)
+        self.assertEqual(claim_jobs(10), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_failed_job_retried_then_failed(self):
+        """Упавшая задача откладывается, после всех попыток — ошибка."""
+        job = enqueue('core.tests.explode')
+        self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertIn('Сбой задачи', job.error)
+        Job.objects.filter(pk=job.pk).update(attempts=JOB_MAX_ATTEMPTS - 1)
+        Job.objects.filter(pk=job.pk).update(run_after=job.created)
+        self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaServingTest(TestCase):
+    content = bytes(range(100))
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (HASHED_NAME, 'posts/plain.gif'):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file_:
+                file_.write(cls.content)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get(self, name, **headers):
+        return self.client.get(settings.MEDIA_URL + name, **headers)
+
+    def test_hashed_file_is_immutable(self):
+        """Файл с хеш-именем отдаётся с сильным ETag и вечным кэшем."""
+        response = self.get(HASHED_NAME)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['ETag'], f'"{"ab" * 32}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_plain_file_has_weak_etag(self):
+        """Обычный файл получает слабый ETag и короткий кэш."""
+        response = self.get('posts/plain.gif')
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_if_none_match_returns_not_modified(self):
+        """Совпавший ETag даёт 304 без тела."""
+        etag = self.get(HASHED_NAME)['ETag']
+        response = self.get(HASHED_NAME, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_range_requests(self):
+        """Range отдаёт часть файла, диапазон вне файла — 416."""
+        cases = (
+            ('bytes=10-19', 'bytes 10-19/100', self.content[10:20]),
+            ('bytes=90-', 'bytes 90-99/100', self.content[90:]),
+            ('bytes=-5', 'bytes 95-99/100', self.content[95:]),
+        )
+        for header, content_range, body in cases:
+            with self.subTest(header=header):
+                response = self.get(HASHED_NAME, HTTP_RANGE=header)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.PARTIAL_CONTENT)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(b''.join(response.streaming_content), body)
+        response = self.get(HASHED_NAME, HTTP_RANGE='bytes=200-')
+        self.assertEqual(
+            response.status_code, HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_stale_if_range_returns_whole_file(self):
+        """При устаревшем If-Range файл отдаётся целиком."""
+        response = self.get(
+            HASHED_NAME, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT='/protected/')
+    def test_accel_redirect(self):
+        """С MEDIA_ACCEL_REDIRECT файл отдаёт nginx."""
+        response = self.get(HASHED_NAME)
+        self.assertEqual(
+            response['X-Accel-Redirect'], f'/protected/{HASHED_NAME}')
+        self.assertEqual(response.content, b'')
+
+    def test_path_outside_media_root(self):
+        """Путь за пределы MEDIA_ROOT и несуществующий файл — 404."""
+        for name in ('../manage.py', 'posts/missing.gif', 'posts/'):
+            with self.subTest(name=name):
+                self.assertEqual(
+                    self.get(name).status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(
+    STATIC_ROOT=TEMP_STATIC_ROOT,
+    STATICFILES_DIRS=[TEMP_STATIC_SOURCE],
+    STATICFILES_STORAGE='core.storage.CompressedManifestStaticFilesStorage',
+)
+class StaticServingTest(TestCase):
+    css = b'body { color: #333; }\n' * 50
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(TEMP_STATIC_SOURCE, 'css'), exist_ok=True)
+        with open(os.path.join(TEMP_STATIC_SOURCE, 'css', 'site.css'),
+                  'wb') as file_:
+            file_.write(cls.css)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_STATIC_SOURCE, ignore_errors=True)
+        shutil.rmtree(TEMP_STATIC_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        call_command(
+            'collectstatic', interactive=False, verbosity=0,
+            ignore_patterns=['admin'])
+        storage = storage_module.CompressedManifestStaticFilesStorage()
+        self.hashed = storage.stored_name('css/site.css')
+
+    def get(self, name, **headers):
+        return self.client.get(settings.STATIC_URL + name, **headers)
+
+    def test_collectstatic_writes_compressed_copies(self):
+        """collectstatic кладёт рядом с хеш-именем сжатую копию .gz."""
+        self.assertRegex(self.hashed, r'^css/site\.[0-9a-f]{12}\.css$')
+        path = os.path.join(TEMP_STATIC_ROOT, self.hashed)
+        with gzip.open(path + '.gz') as file_:
+            self.assertEqual(file_.read(), self.css)
+        self.assertEqual(
+            os.path.exists(path + '.br'), storage_module.brotli is not None)
+
+    def test_name_missing_from_manifest_hashed(self):
+        """Файл, которого нет в манифесте, получает хеш по содержимому."""
+        storage = storage_module.CompressedManifestStaticFilesStorage()
+        storage.hashed_files.clear()
+        self.assertEqual(storage.stored_name('css/site.css'), self.hashed)
+
+    def test_precompressed_copy_by_accept_encoding(self):
+        """Сжатая копия отдаётся только клиенту, который её принимает."""
+        response = self.get(self.hashed, HTTP_ACCEPT_ENCODING='gzip, br')
+        encoding = 'br' if storage_module.brotli else 'gzip'
+        self.assertEqual(response['Content-Encoding'], encoding)
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].endswith(f'-{encoding}"'))
+        self.assertEqual(
+            response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        for header in ('identity', 'gzip;q=0'):
+            with self.subTest(header=header):
+                response = self.get(
+                    self.hashed, HTTP_ACCEPT_ENCODING=header)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertEqual(
+                    b''.join(response.streaming_content), self.css)
+
+    def test_unhashed_name_has_short_cache(self):
+        """Исходное имя без хеша кэшируется ненадолго."""
+        response = self.get('css/site.css')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotIn('immutable', response['Cache-Control'])
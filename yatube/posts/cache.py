@@ -0,0 +1,80 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Group
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+GENERATION_TIMEOUT = None
+
+
+def _digest(value):
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def generation_key(scope):
+    return f'posts:generation:{_digest(scope)}'
+
+
+def get_generations(scopes):
+    """Текущие поколения областей, недостающие создаются заново."""
+    keys = [generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Начальное значение от времени, чтобы после вытеснения ключа
+            # не вернуться к номеру, под которым уже лежат старые страницы.
+            cache.add(key, time.time_ns(), GENERATION_TIMEOUT)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), GENERATION_TIMEOUT)
+
+
+def bump_generations(*scopes):
+    """Сбрасывает кэш страниц, зависящих от областей.
+
+    Поколение увеличивается сразу и ещё раз после коммита: страница,
+    собранная между записью и коммитом, тоже не переживёт транзакцию.
+    """
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def post_scopes(post, group_ids):
+    scopes = ['posts', f'post:{post.pk}', f'author:{post.author.username}']
+    slugs = Group.objects.filter(
+        pk__in=[pk for pk in group_ids if pk]).values_list('slug', flat=True)
+    scopes.extend(f'group:{slug}' for slug in slugs)
+    return scopes
+
+
+def cache_by_generation(get_scopes, timeout=PAGE_CACHE_TIMEOUT):
+    """Кэширует страницу для анонимов под ключом с поколениями областей."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            scopes = get_scopes(*args, **kwargs)
+            generations = ':'.join(map(str, get_generations(scopes)))
+            key = 'posts:page:{}'.format(
+                _digest(f'{request.get_full_path()}|{generations}'))
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,74 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Exists, Max, OuterRef
+from django.views.decorators.http import condition
+
+from .models import Follow, Group, Post, User
+
+
+def index_state(request):
+    return Post.objects.order_by().aggregate(
+        latest=Max('updated'), count=Count('pk'))
+
+
+def group_state(request, slug):
+    return Group.objects.filter(slug=slug).annotate(
+        latest=Max('posts__updated'), count=Count('posts'),
+    ).values('latest', 'count', 'title', 'description').first()
+
+
+def profile_state(request, username):
+    fields = ['latest', 'count', 'first_name', 'last_name',
+              'stats__followers_count', 'stats__following_count']
+    authors = User.objects.filter(username=username).annotate(
+        latest=Max('posts__updated'), count=Count('posts'))
+    if request.user.is_authenticated:
+        authors = authors.annotate(is_following=Exists(Follow.objects.filter(
+            user=request.user, author=OuterRef('pk'))))
+        fields.append('is_following')
+    return authors.values(*fields).first()
+
+
+def post_state(request, post_id):
+    # comment_count и updated поста меняют сигналы комментариев,
+    # так что комментарии поста здесь не перебираются.
+    post = Post.objects.filter(pk=post_id).values(
+        'updated', 'comment_count',
+        'author__stats__followers_count',
+        'author__stats__posts_count',
+    ).first()
+    if post is not None:
+        post['latest'] = post['updated']
+    return post
+
+
+def conditional_page(get_state):
+    """Отвечает 304 Not Modified, если страница не изменилась.
+
+    get_state(request, *args, **kwargs) одним запросом собирает то, от чего
+    зависит страница, с ключом latest для Last-Modified; None — страницы
+    нет, решает сама view. ETag учитывает ещё и зрителя: пользователя и
+    CSRF-cookie, токен которой вшит в формы страницы.
+    """
+    def state(request, *args, **kwargs):
+        if not hasattr(request, 'page_state'):
+            request.page_state = get_state(request, *args, **kwargs)
+        return request.page_state
+
+    def etag(request, *args, **kwargs):
+        page_state = state(request, *args, **kwargs)
+        if page_state is None:
+            return None
+        viewer = '{}|{}'.format(
+            request.user.pk,
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        )
+        values = sorted(page_state.items())
+        return hashlib.md5(f'{viewer}|{values}'.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        page_state = state(request, *args, **kwargs)
+        return page_state and page_state['latest']
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
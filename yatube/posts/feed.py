@@ -0,0 +1,150 @@
+from itertools import chain
+
+from django.db.models import Max, Q
+
+from .models import FeedEntry, Follow, Post, UserStats
+
+# Авторы с большим числом подписчиков не рассылаются по лентам при записи,
+# их посты подтягиваются в ленту подписчика при чтении.
+FEED_FANOUT_LIMIT = 10000
+FEED_BACKFILL_LIMIT = 1000
+FEED_BATCH_SIZE = 500
+# Поля, которые выводят карточки ленты и миниатюры. Полный текст,
+# хеш картинки и строка автора с паролем в ленту не грузятся.
+CARD_FIELDS = (
+    'pub_date',
+    'comment_count',
+    'excerpt_html',
+    'image',
+    'image_width',
+    'image_height',
+    'image_placeholder',
+    'image_variants_ready',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group__slug',
+    'group__title',
+)
+
+
+def card_fields(prefix=''):
+    return [prefix + field for field in CARD_FIELDS]
+
+
+def card_posts(queryset):
+    """Посты для карточек ленты: только поля, которые выводят шаблоны."""
+    return queryset.select_related('author', 'group').only(*card_fields())
+
+
+def card_entries(queryset, *fields):
+    """То же для записей со ссылкой post: FeedEntry, PostTag, Mention.
+
+    В fields нужен и внешний ключ, через менеджер которого получен
+    queryset: менеджер проставляет его каждой записи.
+    """
+    return queryset.select_related('post__author', 'post__group').only(
+        'pub_date', *fields, *card_fields('post__'))
+
+
+def _save_entries(entries):
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=FEED_BATCH_SIZE, ignore_conflicts=True)
+
+
+def is_popular(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id, followers_count__gt=FEED_FANOUT_LIMIT).exists()
+
+
+def popular_authors(user):
+    """Авторы из подписок пользователя, для которых нет рассылки."""
+    return list(
+        Follow.objects.filter(
+            user=user,
+            author__stats__followers_count__gt=FEED_FANOUT_LIMIT,
+        ).values_list('author', flat=True)
+    )
+
+
+def fan_out_post(post_id):
+    """Задача воркера: раскладывает новый пост по лентам подписчиков.
+
+    Пока она не выполнена, пост подтягивает в ленту pull_posts.
+    """
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'pub_date').first()
+    if post is None:
+        return
+    if not is_popular(post['author_id']):
+        followers = Follow.objects.filter(
+            author_id=post['author_id']).values_list('user_id', flat=True)
+        _save_entries(
+            FeedEntry(user_id=user_id, post_id=post_id, **post)
+            for user_id in followers.iterator()
+        )
+    Post.objects.filter(pk=post_id).update(fanned_out=True)
+
+
+def backfill_follow(follow):
+    """Добавляет в ленту последние посты автора после подписки."""
+    posts = Post.objects.filter(
+        author_id=follow.author_id).values_list('pk', 'pub_date')
+    _save_entries(
+        FeedEntry(
+            user_id=follow.user_id,
+            post_id=post_id,
+            author_id=follow.author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts[:FEED_BACKFILL_LIMIT]
+    )
+
+
+def prune_follow(follow):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id).delete()
+
+
+def pull_posts(user):
+    """Догружает в ленту посты, которых в ней нет из-за рассылки.
+
+    Это новые посты, которые воркер ещё не разложил по лентам, и свежие
+    посты популярных авторов. Вторые берутся от старых к новым: если их
+    больше FEED_BACKFILL_LIMIT, остаток догрузит следующее чтение.
+    """
+    pending = list(
+        Post.objects.filter(
+            fanned_out=False,
+            author_id__in=Follow.objects.filter(user=user).values('author'),
+        ).order_by().values_list(
+            'pk', 'author_id', 'pub_date')[:FEED_BACKFILL_LIMIT]
+    )
+    popular = []
+    authors = popular_authors(user)
+    if authors:
+        last_seen = dict(
+            FeedEntry.objects.filter(
+                user=user, author__in=authors
+            ).order_by().values_list('author').annotate(Max('pub_date'))
+        )
+        query = Q()
+        for author_id in authors:
+            since = last_seen.get(author_id)
+            if since is None:
+                query |= Q(author_id=author_id)
+            else:
+                query |= Q(author_id=author_id, pub_date__gt=since)
+        popular = Post.objects.filter(query).order_by(
+            'pub_date', 'pk').values_list('pk', 'author_id', 'pub_date')
+        popular = popular[:FEED_BACKFILL_LIMIT - len(pending)]
+    _save_entries(
+        FeedEntry(
+            user_id=user.pk,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, author_id, pub_date in chain(pending, popular)
+    )
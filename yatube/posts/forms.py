@@ -2,12 +2,50 @@ from django import forms
 
 from .models import Comment, Post
 
+ALLOWED_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+MAX_IMAGE_PIXELS = 40_000_000
+
 
 class PostForm(forms.ModelForm):
+    def __init__(self, *args, rejected_uploads=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rejected_uploads = rejected_uploads
+
     class Meta:
         model = Post
         fields = ["text", "group", "image"]
 
+    def clean_image(self):
+        """Проверяет формат и размеры по заголовку картинки.
+
+        ImageField открывает файл лениво и пиксели не распаковывает,
+        так что «бомба» с огромными размерами отсекается до декодирования.
+        """
+        image = self.cleaned_data['image']
+        header = getattr(image, 'image', None)
+        if header is None:
+            return image
+        if header.format not in ALLOWED_IMAGE_FORMATS:
+            raise forms.ValidationError(
+                'Формат картинки не поддерживается.', code='invalid_image')
+        width, height = header.size
+        if width * height > MAX_IMAGE_PIXELS:
+            raise forms.ValidationError(
+                'Картинка слишком большая: не больше %(limit)s пикселей.',
+                code='too_many_pixels',
+                params={'limit': MAX_IMAGE_PIXELS},
+            )
+        return image
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if 'image' in self.rejected_uploads:
+            self.add_error('image', 'Файл слишком большой.')
+        if 'upload_token' in self.rejected_uploads:
+            self.add_error(
+                'image', 'Загрузка не найдена или ещё не завершена.')
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
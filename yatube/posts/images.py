@@ -0,0 +1,120 @@
+import base64
+import hashlib
+import os
+import re
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageFilter, ImageOps
+
+HASH_CHUNK_SIZE = 64 * 1024
+# Ширины адаптивных копий с кадрированием как у миниатюры ленты 960x339.
+VARIANT_WIDTHS = (480, 960)
+VARIANT_RATIO = 339 / 960
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+VARIANT_QUALITY = 80
+# Форматы, которые несут EXIF: их перекодируем без метаданных, GIF — нет.
+REENCODE_OPTIONS = {
+    'JPEG': {'quality': 90},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+PLACEHOLDER_WIDTH = 20
+PLACEHOLDER_QUALITY = 50
+HASHED_NAME = re.compile(r'^[\w/]*/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+def file_digest(file_):
+    """sha256 содержимого файла, файл остаётся в начале."""
+    file_.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file_.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file_.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(prefix, digest, extension):
+    """Путь вида posts/ab/cd/<sha256>.jpg: по 256 подкаталогов на уровень."""
+    return f'{prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}'
+
+
+def image_metadata(file_):
+    """Размеры, sha256 и MIME-тип картинки из открытого файла.
+
+    Pillow читает только заголовок, содержимое идёт в хеш порциями.
+    """
+    digest = file_digest(file_)
+    with Image.open(file_) as image:
+        width, height = image.size
+        mime = Image.MIME.get(image.format, '')
+    file_.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_hash': digest,
+        'image_mime': mime,
+    }
+
+
+def path_metadata(path):
+    """То же для файла на диске, для запуска в пуле процессов."""
+    with open(path, 'rb') as file_:
+        return image_metadata(file_)
+
+
+def strip_metadata(file_):
+    """Перекодирует картинку без EXIF, применив поворот из него.
+
+    Возвращает байты нового файла или None для форматов без EXIF.
+    Цветовой профиль сохраняется.
+    """
+    with Image.open(file_) as image:
+        format_ = image.format
+        options = REENCODE_OPTIONS.get(format_)
+        if options is None:
+            return None
+        icc_profile = image.info.get('icc_profile')
+        clean = ImageOps.exif_transpose(image)
+        buffer = BytesIO()
+        if icc_profile:
+            options = dict(options, icc_profile=icc_profile)
+        clean.save(buffer, format_, **options)
+    return buffer.getvalue()
+
+
+def variant_name(name, width, extension):
+    """Имя копии рядом с оригиналом: posts/ab/cd/<sha256>_480.webp."""
+    return f'{os.path.splitext(name)[0]}_{width}.{extension}'
+
+
+def placeholder_data_uri(image):
+    """Размытое превью шириной 20px в виде data URI для inline-вставки."""
+    size = (PLACEHOLDER_WIDTH, round(PLACEHOLDER_WIDTH * VARIANT_RATIO))
+    preview = ImageOps.fit(image, size, Image.BILINEAR)
+    preview = preview.filter(ImageFilter.GaussianBlur(1))
+    buffer = BytesIO()
+    preview.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/jpeg;base64,{encoded}'
+
+
+def make_variants(storage, name):
+    """Режет оригинал на копии всех ширин в WebP и JPEG.
+
+    Из того же декодированного кадра считается превью-заглушка,
+    её data URI функция возвращает.
+    """
+    with storage.open(name) as file_, Image.open(file_) as image:
+        # У GIF берётся первый кадр, прозрачность заливается при convert.
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for width in VARIANT_WIDTHS:
+            size = (width, round(width * VARIANT_RATIO))
+            resized = ImageOps.fit(image, size, Image.LANCZOS)
+            for extension, format_ in VARIANT_FORMATS.items():
+                buffer = BytesIO()
+                resized.save(buffer, format_, quality=VARIANT_QUALITY)
+                storage.save_exact(
+                    variant_name(name, width, extension),
+                    ContentFile(buffer.getvalue()))
+        return placeholder_data_uri(image)
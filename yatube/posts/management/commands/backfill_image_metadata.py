@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.images import path_metadata
+from posts.models import Post
+
+METADATA_FIELDS = ['image_width', 'image_height', 'image_hash', 'image_mime']
+
+
+def read_metadata(path):
+    try:
+        return path_metadata(path)
+    except (OSError, SyntaxError):
+        # SyntaxError Pillow бросает на битых файлах некоторых форматов.
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры, хеш и MIME-тип картинок постов, '
+        'читая файлы из MEDIA_ROOT в пуле процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        posts = Post.objects.exclude(image='').filter(
+            image_hash='').only('pk', 'image').order_by('pk')
+        filled = skipped = last_id = 0
+        with ProcessPoolExecutor(options['workers']) as pool:
+            while True:
+                chunk = list(posts.filter(pk__gt=last_id)[:chunk_size])
+                if not chunk:
+                    break
+                last_id = chunk[-1].pk
+                paths = [
+                    os.path.join(settings.MEDIA_ROOT, post.image.name)
+                    for post in chunk
+                ]
+                # Процессы пула не должны унаследовать соединение с базой.
+                connections.close_all()
+                changed = []
+                for post, metadata in zip(
+                    chunk, pool.map(read_metadata, paths)
+                ):
+                    if metadata is None:
+                        skipped += 1
+                        self.stderr.write(
+                            f'Пост {post.pk}: не прочитан {post.image.name}')
+                        continue
+                    for field, value in metadata.items():
+                        setattr(post, field, value)
+                    changed.append(post)
+                Post.objects.bulk_update(changed, METADATA_FIELDS)
+                filled += len(changed)
+        self.stdout.write(f'Заполнено постов: {filled}, пропущено: {skipped}')
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from posts.models import Post, PostTag
+from posts.tags import extract_tags, tag_ids
+
+
+class Command(BaseCommand):
+    help = 'Заполняет хештеги существующих постов порциями по id.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = Post.objects.aggregate(Max('pk'))['pk__max'] or 0
+        changed = 0
+        for start in range(0, last_id, chunk_size):
+            changed += self.process_chunk(start, start + chunk_size)
+        self.stdout.write(f'Обновлено хештегов: {changed}')
+
+    def process_chunk(self, start, end):
+        posts = Post.objects.filter(
+            pk__gt=start, pk__lte=end).values_list('pk', 'text', 'pub_date')
+        wanted = {
+            (post_id, name): pub_date
+            for post_id, text, pub_date in posts
+            for name in extract_tags(text)
+        }
+        current = {
+            (post_id, name): pk
+            for pk, post_id, name in PostTag.objects.filter(
+                post_id__gt=start, post_id__lte=end,
+            ).values_list('pk', 'post_id', 'tag__name')
+        }
+        removed = [pk for key, pk in current.items() if key not in wanted]
+        added = wanted.keys() - current.keys()
+        with transaction.atomic():
+            PostTag.objects.filter(pk__in=removed).delete()
+            ids = tag_ids({name for _, name in added}) if added else {}
+            PostTag.objects.bulk_create(
+                [
+                    PostTag(
+                        tag_id=ids[name],
+                        post_id=post_id,
+                        pub_date=wanted[post_id, name],
+                    )
+                    for post_id, name in added
+                ],
+                ignore_conflicts=True,
+            )
+        return len(removed) + len(added)
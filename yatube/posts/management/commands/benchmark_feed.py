@@ -0,0 +1,81 @@
+import tracemalloc
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.feed import card_posts
+from posts.models import Group, Post, User
+from posts.rendering import render_post
+
+SEED_PARAGRAPH = 'Длинный текст поста для проверки ленты. ' * 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает память и время загрузки страниц ленты: полные модели '
+        'Post против карточек card_posts. С --seed работает на временных '
+        'постах, которые потом откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Сколько временных постов с текстом около 4 КБ создать.',
+        )
+
+    def handle(self, *args, **options):
+        pages, size = options['pages'], options['page_size']
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'])
+            variants = (
+                ('Полные модели', Post.objects.select_related(
+                    'author', 'group')),
+                ('Карточки', card_posts(Post.objects.all())),
+            )
+            for label, queryset in variants:
+                queryset = queryset.order_by('-pub_date', '-pk')
+                kept, peak, seconds = self.measure(queryset, pages, size)
+                self.stdout.write(
+                    f'{label}: {kept / pages / 1024:.1f} КБ на страницу '
+                    f'(пик {peak / pages / 1024:.1f} КБ), '
+                    f'{seconds / pages * 1000:.2f} мс на страницу')
+            transaction.set_rollback(True)
+
+    def measure(self, queryset, pages, size):
+        list(queryset[:size])  # прогрев: компиляция запроса и кэши Django
+        kept = peak = 0
+        started = perf_counter()
+        for number in range(pages):
+            list(queryset[number * size:(number + 1) * size])
+        seconds = perf_counter() - started
+        for number in range(pages):
+            tracemalloc.start()
+            rows = list(queryset[number * size:(number + 1) * size])
+            current, page_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            kept += current
+            peak += page_peak
+            del rows
+        return kept, peak, seconds
+
+    def seed(self, count):
+        author = User.objects.create_user(
+            username='benchmark_feed', password='benchmark-password')
+        group = Group.objects.create(
+            title='Замеры', slug='benchmark-feed', description='Замеры')
+        posts = []
+        for number in range(count):
+            post = Post(
+                text=f'{number}. ' + '\n\n'.join([SEED_PARAGRAPH] * 5),
+                author=author,
+                group=group,
+            )
+            render_post(post, {})
+            posts.append(post)
+        Post.objects.bulk_create(posts, batch_size=500)
@@ -0,0 +1,37 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import ChunkedUpload
+from posts.resumable import (UPLOAD_EXPIRY, expired_uploads, parts_dir,
+                             remove_part)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет брошенные загрузки по частям и их временные файлы, '
+        'а также файлы без записи в базе.'
+    )
+
+    def handle(self, *args, **options):
+        removed = 0
+        for token in list(
+            expired_uploads().values_list('token', flat=True)
+        ):
+            ChunkedUpload.objects.filter(token=token).delete()
+            remove_part(token)
+            removed += 1
+        directory = parts_dir()
+        cutoff = time.time() - UPLOAD_EXPIRY.total_seconds()
+        if os.path.isdir(directory):
+            for entry in os.scandir(directory):
+                token = entry.name[:-len('.part')]
+                if (
+                    entry.name.endswith('.part')
+                    and entry.stat().st_mtime < cutoff
+                    and not ChunkedUpload.objects.filter(token=token).exists()
+                ):
+                    os.remove(entry.path)
+                    removed += 1
+        self.stdout.write(f'Удалено загрузок: {removed}')
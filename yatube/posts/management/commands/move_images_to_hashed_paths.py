@@ -0,0 +1,68 @@
+import os
+import shutil
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts.images import HASHED_NAME, file_digest, hashed_name
+from posts.models import Post
+from posts.thumbnails import schedule_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из плоского каталога posts/ '
+        'в posts/ab/cd/<sha256> и обновляет пути порциями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.storage = Post._meta.get_field('image').storage
+        posts = Post.objects.exclude(image='').order_by('pk')
+        moved = last_id = 0
+        while True:
+            chunk = list(posts.filter(pk__gt=last_id).values_list(
+                'pk', 'image')[:options['chunk_size']])
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            names = {name for _, name in chunk if not HASHED_NAME.match(name)}
+            moved += self.move_chunk(names)
+        self.stdout.write(f'Перенесено файлов: {moved}')
+
+    def move_chunk(self, names):
+        renamed = {}
+        for name in names:
+            path = self.storage.path(name)
+            if not os.path.exists(path):
+                self.stderr.write(f'Нет файла {name}')
+                continue
+            with open(path, 'rb') as file_:
+                digest = file_digest(file_)
+            new_name = hashed_name(
+                os.path.dirname(name), digest, os.path.splitext(name)[1])
+            new_path = self.storage.path(new_name)
+            if not os.path.exists(new_path):
+                # Копия, а не перенос: до коммита старый путь ещё нужен.
+                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                shutil.copyfile(path, new_path)
+            renamed[name] = (new_name, digest)
+        with transaction.atomic():
+            for name, (new_name, digest) in renamed.items():
+                Post.objects.filter(image=name).update(
+                    image=new_name,
+                    image_hash=digest,
+                    image_variants_ready=False,
+                    updated=timezone.now(),
+                )
+            # Миниатюры sorl и копии привязаны к имени исходного файла.
+            for post in Post.objects.filter(
+                image__in=[new for new, _ in renamed.values()]
+            ).only('pk'):
+                schedule_thumbnails(post)
+        for name in renamed:
+            self.storage.delete(name)
+        return len(renamed)
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает Post.comment_count (активные комментарии) '
+        'порциями по id постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = Post.objects.aggregate(Max('pk'))['pk__max'] or 0
+        drift = 0
+        for start in range(0, last_id, chunk_size):
+            drift += self.process_chunk(
+                start, start + chunk_size, options['check'])
+        if options['check']:
+            self.stdout.write(f'Расхождений: {drift}')
+        else:
+            self.stdout.write(f'Исправлено постов: {drift}')
+
+    def process_chunk(self, start, end, check):
+        posts = dict(Post.objects.filter(
+            pk__gt=start, pk__lte=end,
+        ).values_list('pk', 'comment_count'))
+        actual = dict(Comment.objects.filter(
+            post_id__gt=start, post_id__lte=end, active=True,
+        ).order_by().values_list('post').annotate(Count('pk')))
+        drift = 0
+        for post_id, stored in posts.items():
+            real = actual.get(post_id, 0)
+            if stored == real:
+                continue
+            drift += 1
+            if check:
+                self.stdout.write(
+                    f'Пост {post_id}: сохранено {stored}, '
+                    f'на самом деле {real}')
+            else:
+                Post.objects.filter(pk=post_id).update(comment_count=real)
+        return drift
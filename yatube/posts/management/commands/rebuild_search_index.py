@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from posts import search
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает полнотекстовый индекс постов и комментариев '
+        'порциями по id, каждая порция в своей короткой транзакции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--optimize',
+            action='store_true',
+            help='Слить сегменты индекса после перестройки.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        max_rowid, min_rowid = search.indexed_range()
+        # Диапазоны захватывают и строки индекса без исходной записи.
+        last_post = max(
+            Post.objects.aggregate(Max('pk'))['pk__max'] or 0,
+            max_rowid or 0)
+        last_comment = max(
+            Comment.objects.aggregate(Max('pk'))['pk__max'] or 0,
+            -(min_rowid or 0))
+        for start in range(0, last_post, chunk_size):
+            search.reindex_posts(start, start + chunk_size)
+        for start in range(0, last_comment, chunk_size):
+            search.reindex_comments(start, start + chunk_size)
+        if options['optimize']:
+            search.optimize()
+        self.stdout.write(
+            f'Проиндексировано постов до id {last_post}, '
+            f'комментариев до id {last_comment}')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import User
+from posts.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику пользователей порциями по id.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        user_ids = list(
+            User.objects.order_by('pk').values_list('pk', flat=True))
+        changed = 0
+        for start in range(0, len(user_ids), chunk_size):
+            changed += rebuild_stats(user_ids[start:start + chunk_size])
+        self.stdout.write(f'Обновлено записей: {changed}')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.jobs import enqueue
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Ставит в очередь генерацию адаптивных копий и превью картинок, '
+        'выполняет их воркер run_jobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и там, где они уже готовы.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').order_by('pk')
+        if not options['all']:
+            posts = posts.filter(
+                Q(image_variants_ready=False) | Q(image_placeholder=''))
+        queued = last_id = 0
+        while True:
+            chunk = list(posts.filter(pk__gt=last_id).values_list(
+                'pk', flat=True)[:options['chunk_size']])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+            for post_id in chunk:
+                enqueue('posts.thumbnails.generate_variants', post_id=post_id)
+            queued += len(chunk)
+        self.stdout.write(f'Поставлено в очередь: {queued}')
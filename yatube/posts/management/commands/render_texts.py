@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from posts.cache import bump_generations, post_scopes
+from posts.mentions import sync_mentions
+from posts.models import Comment, Post, User
+from posts.rendering import extract_mentions, render_comment, render_post
+
+
+def sync_post_mentions(post, user_ids):
+    sync_mentions(
+        post.mentions.filter(comment=None), user_ids,
+        post=post, pub_date=post.pub_date)
+
+
+def sync_comment_mentions(comment, user_ids):
+    sync_mentions(
+        comment.mentions.all(), user_ids if comment.active else set(),
+        post_id=comment.post_id, comment=comment, pub_date=comment.created)
+
+
+# Модель, функция рендера, поля HTML, что загрузить вместе с записью,
+# пост записи (по нему сбрасывается кэш) и синхронизация упоминаний.
+SOURCES = (
+    (Post, render_post, ['text_html', 'excerpt_html'], 'author',
+     lambda post: post, sync_post_mentions),
+    (Comment, render_comment, ['text_html'], 'post__author',
+     lambda comment: comment.post, sync_comment_mentions),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново рендерит HTML постов и комментариев и выдержки постов '
+        'порциями по id: после обновления или для новых упоминаний.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        changed = 0
+        for source in SOURCES:
+            model = source[0]
+            last_id = model.objects.aggregate(Max('pk'))['pk__max'] or 0
+            for start in range(0, last_id, chunk_size):
+                changed += self.process_chunk(
+                    *source, start, start + chunk_size)
+        self.stdout.write(f'Перерендерено записей: {changed}')
+
+    def process_chunk(self, model, render, fields, related, get_post,
+                      sync, start, end):
+        rows = list(
+            model.objects.filter(pk__gt=start, pk__lte=end)
+            .select_related(related))
+        names = set().union(*(extract_mentions(row.text) for row in rows))
+        users = dict(User.objects.filter(
+            username__in=names).values_list('username', 'pk'))
+        changed = []
+        for row in rows:
+            before = [getattr(row, field) for field in fields]
+            render(row, users)
+            if before != [getattr(row, field) for field in fields]:
+                row.updated = timezone.now()
+                changed.append(row)
+        if changed:
+            posts = {post.pk: post for post in map(get_post, changed)}
+            with transaction.atomic():
+                model.objects.bulk_update(changed, fields + ['updated'])
+                for row in changed:
+                    sync(row, {
+                        users[name] for name in extract_mentions(row.text)
+                        if name in users})
+                # Страницы в кэше собраны со старым HTML.
+                bump_generations(*{
+                    scope for post in posts.values()
+                    for scope in post_scopes(post, {post.group_id})})
+        return len(changed)
@@ -0,0 +1,35 @@
+from .models import Mention, User
+from .rendering import extract_mentions
+
+
+def resolve_mentions(text):
+    """{имя: id} упомянутых пользователей одним запросом username__in."""
+    names = extract_mentions(text)
+    if not names:
+        return {}
+    return dict(
+        User.objects.filter(username__in=names).values_list('username', 'pk'))
+
+
+def render_with_mentions(instance, render):
+    """Рендерит HTML записи через render и запоминает упомянутых."""
+    users = resolve_mentions(instance.text)
+    render(instance, users)
+    instance._mentioned = set(users.values())
+
+
+def sync_mentions(current, user_ids, **fields):
+    """Приводит упоминания источника к user_ids, трогая только разницу.
+
+    current — queryset упоминаний источника или None для новой записи,
+    fields — поля новых упоминаний.
+    """
+    existing = {} if current is None else dict(
+        current.values_list('user_id', 'pk'))
+    removed = [pk for user_id, pk in existing.items()
+               if user_id not in user_ids]
+    if removed:
+        Mention.objects.filter(pk__in=removed).delete()
+    Mention.objects.bulk_create(
+        Mention(user_id=user_id, **fields)
+        for user_id in user_ids - existing.keys())
@@ -0,0 +1,71 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:27
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def delete_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    duplicates = Follow.objects.values('user', 'author').annotate(
+        keep_id=models.Min('id'),
+        total=models.Count('id'),
+    ).filter(total__gt=1)
+    for pair in list(duplicates):
+        while True:
+            extra = list(Follow.objects.filter(
+                user_id=pair['user'], author_id=pair['author'],
+            ).exclude(
+                id=pair['keep_id'],
+            ).values_list('id', flat=True)[:BATCH_SIZE])
+            if not extra:
+                break
+            Follow.objects.filter(id__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_feedentry'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='feedentry',
+            name='feed_user_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='feedentry',
+            name='feed_user_author_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'pub_date'], name='feed_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author', 'pub_date'], name='feed_user_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['pub_date'], name='post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'pub_date'], name='post_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'pub_date'], name='post_group_date_idx'),
+        ),
+        migrations.RunPython(
+            delete_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
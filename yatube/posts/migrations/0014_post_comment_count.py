@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:29
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+CHUNK_SIZE = 1000
+
+
+def fill_comment_count(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = Comment.objects.filter(
+        post=models.OuterRef('pk'),
+    ).order_by().values('post').annotate(
+        total=models.Count('pk'),
+    ).values('total')
+    last_id = Post.objects.aggregate(models.Max('pk'))['pk__max'] or 0
+    for start in range(0, last_id, CHUNK_SIZE):
+        Post.objects.filter(
+            pk__gt=start, pk__lte=start + CHUNK_SIZE,
+        ).update(comment_count=Coalesce(models.Subquery(comments), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_indexes_and_unique_follow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_comment_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:34
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+CHUNK_SIZE = 1000
+
+
+def count_active_comments(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = Comment.objects.filter(
+        post=models.OuterRef('pk'), active=True,
+    ).order_by().values('post').annotate(
+        total=models.Count('pk'),
+    ).values('total')
+    last_id = Post.objects.aggregate(models.Max('pk'))['pk__max'] or 0
+    for start in range(0, last_id, CHUNK_SIZE):
+        Post.objects.filter(
+            pk__gt=start, pk__lte=start + CHUNK_SIZE,
+        ).update(comment_count=Coalesce(models.Subquery(comments), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_userstats'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_post_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(active=True), fields=['post', 'created'], name='comment_active_idx'),
+        ),
+        migrations.RunPython(
+            count_active_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_image_hashed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Адаптивные копии готовы'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+from django.db import migrations
+
+# Посты лежат в индексе под rowid = id поста, активные комментарии —
+# под rowid = -id комментария: одна таблица даёт сравнимый ранг bm25.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE posts_search USING fts5(
+        body, post_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER posts_post_search_insert AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO posts_search (rowid, body, post_id)
+        VALUES (new.id, new.text, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_search_update AFTER UPDATE OF text
+    ON posts_post BEGIN
+        UPDATE posts_search SET body = new.text WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_search_delete AFTER DELETE ON posts_post
+    BEGIN
+        DELETE FROM posts_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_comment_search_insert AFTER INSERT
+    ON posts_comment WHEN new.active BEGIN
+        INSERT INTO posts_search (rowid, body, post_id)
+        VALUES (-new.id, new.text, new.post_id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_comment_search_update AFTER UPDATE OF text, active
+    ON posts_comment BEGIN
+        DELETE FROM posts_search WHERE rowid = -old.id;
+        INSERT INTO posts_search (rowid, body, post_id)
+        SELECT -new.id, new.text, new.post_id WHERE new.active;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_comment_search_delete AFTER DELETE ON posts_comment
+    BEGIN
+        DELETE FROM posts_search WHERE rowid = -old.id;
+    END
+    """,
+    """
+    INSERT INTO posts_search (rowid, body, post_id)
+    SELECT id, text, id FROM posts_post
+    """,
+    """
+    INSERT INTO posts_search (rowid, body, post_id)
+    SELECT -id, text, post_id FROM posts_comment WHERE active
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER posts_post_search_insert',
+    'DROP TRIGGER posts_post_search_update',
+    'DROP TRIGGER posts_post_search_delete',
+    'DROP TRIGGER posts_comment_search_insert',
+    'DROP TRIGGER posts_comment_search_update',
+    'DROP TRIGGER posts_comment_search_delete',
+    'DROP TABLE posts_search',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, DROP_SQL),
+    ]
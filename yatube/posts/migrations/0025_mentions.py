@@ -0,0 +1,110 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:58
+
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.html import escape, format_html, linebreaks
+
+BATCH_SIZE = 500
+# Копии из posts.rendering на момент миграции: код приложения и URLconf
+# могут измениться, а миграция должна давать тот же результат.
+MENTION = re.compile(r'(?<![\w@])@([\w+-]+(?:\.[\w+-]+)*)')
+
+
+def extract_mentions(text):
+    return set(MENTION.findall(text or ''))
+
+
+def render_text(text, usernames):
+    def link(match):
+        username = match.group(1)
+        if username not in usernames:
+            return match.group(0)
+        return format_html(
+            '<a href="/profile/{}/">@{}</a>',
+            quote(username, safe="!$&'()*+,;=/~:@"),
+            username,
+        )
+    return linebreaks(MENTION.sub(link, escape(text or '')))
+
+
+def render_batch(User, Mention, model, rows, **fields):
+    names = set().union(*(extract_mentions(row.text) for row in rows))
+    users = dict(User.objects.filter(
+        username__in=names).values_list('username', 'pk'))
+    mentions = []
+    for row in rows:
+        row.text_html = render_text(row.text, users)
+        if getattr(row, 'active', True):
+            mentions.extend(
+                Mention(user_id=users[name], **{
+                    field: getattr(row, attr)
+                    for field, attr in fields.items()
+                })
+                for name in extract_mentions(row.text) if name in users)
+    model.objects.bulk_update(rows, ['text_html'])
+    Mention.objects.bulk_create(mentions)
+
+
+def render_texts(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Mention = apps.get_model('posts', 'Mention')
+    sources = (
+        (apps.get_model('posts', 'Post'),
+         {'post_id': 'pk', 'pub_date': 'pub_date'}),
+        (apps.get_model('posts', 'Comment'),
+         {'post_id': 'post_id', 'comment_id': 'pk', 'pub_date': 'created'}),
+    )
+    for model, fields in sources:
+        last_pk = 0
+        while True:
+            rows = list(model.objects.filter(
+                pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+            if not rows:
+                break
+            render_batch(User, Mention, model, rows, **fields)
+            last_pk = rows[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0024_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Коментарий в HTML'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст в HTML'),
+        ),
+        migrations.CreateModel(
+            name='Mention',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата упоминания')),
+                ('comment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='posts.Comment', verbose_name='Комментарий')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to=settings.AUTH_USER_MODEL, verbose_name='Упомянутый')),
+            ],
+            options={
+                'verbose_name': 'Упоминание',
+                'verbose_name_plural': 'Упоминания',
+                'ordering': ['-pub_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mention',
+            index=models.Index(fields=['user', 'pub_date'], name='mention_user_date_idx'),
+        ),
+        migrations.RunPython(render_texts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:01
+
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.html import escape, format_html, linebreaks
+
+BATCH_SIZE = 500
+# Копии из posts.rendering на момент миграции: код приложения и URLconf
+# могут измениться, а миграция должна давать тот же результат.
+MENTION = re.compile(r'(?<![\w@])@([\w+-]+(?:\.[\w+-]+)*)')
+EXCERPT_LENGTH = 300
+
+
+def render_text(text, usernames):
+    def link(match):
+        username = match.group(1)
+        if username not in usernames:
+            return match.group(0)
+        return format_html(
+            '<a href="/profile/{}/">@{}</a>',
+            quote(username, safe="!$&'()*+,;=/~:@"),
+            username,
+        )
+    return linebreaks(MENTION.sub(link, escape(text or '')))
+
+
+def make_excerpt(text):
+    text = (text or '').strip()
+    if len(text) <= EXCERPT_LENGTH:
+        return text
+    cut = text[:EXCERPT_LENGTH]
+    words = cut.rsplit(None, 1)
+    if not text[EXCERPT_LENGTH].isspace() and len(words) > 1:
+        cut = words[0]
+    return cut.rstrip() + '…'
+
+
+def render_excerpts(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    last_pk = 0
+    while True:
+        rows = list(Post.objects.filter(
+            pk__gt=last_pk).order_by('pk').only('pk', 'text')[:BATCH_SIZE])
+        if not rows:
+            break
+        excerpts = [make_excerpt(row.text) for row in rows]
+        names = set().union(*(MENTION.findall(text) for text in excerpts))
+        users = set(User.objects.filter(
+            username__in=names).values_list('username', flat=True))
+        for row, excerpt in zip(rows, excerpts):
+            row.excerpt_html = render_text(excerpt, users)
+        Post.objects.bulk_update(rows, ['excerpt_html'])
+        last_pk = rows[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0025_mentions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Начало текста в HTML'),
+        ),
+        migrations.RunPython(render_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_post_excerpt_html'),
+    ]
+
+    operations = [
+        # Существующие посты уже разложены по лентам при записи.
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Разослан по лентам'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Разослан по лентам'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(fanned_out=False), fields=['author'], name='post_fanout_pending_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import HashedStorage
+
 User = get_user_model()
 CHARACTER_LIMIT = 15  # ограничение в количестве символов
 
@@ -27,6 +29,11 @@ class Post(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -45,13 +52,80 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=HashedStorage(),
         blank=True
     )
+    # Заполняются при загрузке, чтобы при выводе не открывать файл.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        null=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        null=True,
+        editable=False
+    )
+    image_hash = models.CharField(
+        'SHA-256 картинки',
+        max_length=64,
+        blank=True,
+        editable=False
+    )
+    image_mime = models.CharField(
+        'MIME-тип картинки',
+        max_length=50,
+        blank=True,
+        editable=False
+    )
+    image_placeholder = models.TextField(
+        'Превью-заглушка картинки',
+        blank=True,
+        editable=False
+    )
+    image_variants_ready = models.BooleanField(
+        'Адаптивные копии готовы',
+        default=False,
+        editable=False
+    )
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+    text_html = models.TextField(
+        'Текст в HTML',
+        blank=True,
+        editable=False
+    )
+    excerpt_html = models.TextField(
+        'Начало текста в HTML',
+        blank=True,
+        editable=False
+    )
+    fanned_out = models.BooleanField(
+        'Разослан по лентам',
+        default=False,
+        editable=False
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name_plural = 'Посты'
         verbose_name = 'Пост'
+        # Возрастающие индексы: SQLite читает их в обратном порядке и
+        # отдаёт ленту по (pub_date, id) без сортировки во временном B-tree.
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date'], name='post_author_date_idx'),
+            models.Index(
+                fields=['group', 'pub_date'], name='post_group_date_idx'),
+            # Посты, которые воркер ещё не разложил по лентам.
+            models.Index(
+                fields=['author'], name='post_fanout_pending_idx',
+                condition=models.Q(fanned_out=False)),
+        ]
 
     def __str__(self):
         return self.text[:CHARACTER_LIMIT]
@@ -70,6 +144,10 @@ class Comment(models.Model):
         verbose_name='Автор')
     text = models.TextField(
         verbose_name='Коментарий')
+    text_html = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Коментарий в HTML')
     created = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Создан')
@@ -84,6 +162,12 @@ class Comment(models.Model):
         ordering = ['-created']
         verbose_name_plural = 'Коментарии'
         verbose_name = 'Коментарий'
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_active_idx',
+                condition=models.Q(active=True)),
+        ]
 
     def __str__(self):
         return self.text[:CHARACTER_LIMIT]
@@ -104,6 +188,166 @@ class Follow(models.Model):
     class Meta:
         verbose_name_plural = 'Подписки'
         verbose_name = 'Подписка'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'),
+        ]
 
     def __str__(self):
         return f'{self.user} подписался на {self.author}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name_plural = 'Записи ленты'
+        verbose_name = 'Запись ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date'], name='feed_user_date_idx'),
+            models.Index(
+                fields=['user', 'author', 'pub_date'],
+                name='feed_user_author_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
+
+
+class Tag(models.Model):
+    name = models.CharField('Название', max_length=50, unique=True)
+
+    class Meta:
+        verbose_name_plural = 'Хештеги'
+        verbose_name = 'Хештег'
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class PostTag(models.Model):
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+        verbose_name='Хештег')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+        verbose_name='Пост')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name_plural = 'Хештеги постов'
+        verbose_name = 'Хештег поста'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tag', 'post'], name='unique_post_tag'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['tag', 'pub_date'], name='post_tag_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.tag} у поста {self.post_id}'
+
+
+class Mention(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+        verbose_name='Упомянутый')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+        verbose_name='Пост')
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='mentions',
+        verbose_name='Комментарий')
+    pub_date = models.DateTimeField('Дата упоминания')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name_plural = 'Упоминания'
+        verbose_name = 'Упоминание'
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date'], name='mention_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} упомянут в посте {self.post_id}'
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь')
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Статистика пользователей'
+        verbose_name = 'Статистика пользователя'
+
+    def __str__(self):
+        return f'Статистика {self.user}'
+
+
+class ChunkedUpload(models.Model):
+    """Загрузка картинки по частям, которую можно продолжить с offset."""
+    token = models.CharField('Токен', max_length=32, unique=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='chunked_uploads',
+        verbose_name='Пользователь')
+    filename = models.CharField('Имя файла', max_length=255)
+    size = models.PositiveIntegerField('Размер')
+    offset = models.PositiveIntegerField('Принято байт', default=0)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    updated = models.DateTimeField('Обновлена', auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'Загрузки по частям'
+        verbose_name = 'Загрузка по частям'
+
+    def __str__(self):
+        return f'{self.filename}: {self.offset} из {self.size}'
+
+    @property
+    def complete(self):
+        return self.offset == self.size
@@ -0,0 +1,151 @@
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+KEYSET_ORDERING = ('-pub_date', '-pk')
+
+
+def encode_cursor(obj, number, key_field='pub_date'):
+    """Непрозрачный токен позиции: дата, id объекта и номер его страницы."""
+    raw = f'{getattr(obj, key_field).isoformat()}|{obj.pk}|{number}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(token):
+    """Разбирает токен, для испорченного токена возвращает None."""
+    try:
+        key, pk, number = force_str(
+            urlsafe_base64_decode(token)).split('|')
+        key = parse_datetime(key)
+        if key is None:
+            return None
+        return key, int(pk), int(number)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+def seek(queryset, key_field, key, pk, forward=True):
+    """Объекты строго после (или до) позиции (key, pk) в порядке ленты.
+
+    Лишнее на вид условие key <= позиции (>= назад) даёт SQLite границу
+    диапазона по индексу: без него OR проверяется на каждой строке,
+    начиная с самой свежей.
+    """
+    if forward:
+        return queryset.filter(**{f'{key_field}__lte': key}).filter(
+            Q(**{f'{key_field}__lt': key})
+            | Q(**{key_field: key, 'pk__lt': pk}))
+    return queryset.filter(**{f'{key_field}__gte': key}).filter(
+        Q(**{f'{key_field}__gt': key})
+        | Q(**{key_field: key, 'pk__gt': pk})).reverse()
+
+
+def keyset_chunk(queryset, size, after=None, key_field='pub_date'):
+    """Следующая порция после токена after и токен для порции за ней.
+
+    Не считает COUNT и не знает номеров страниц, подходит для подгрузки
+    «показать ещё».
+    """
+    queryset = queryset.order_by(f'-{key_field}', '-pk')
+    cursor = decode_cursor(after) if after else None
+    if cursor is not None:
+        key, pk, _ = cursor
+        queryset = seek(queryset, key_field, key, pk)
+    rows = list(queryset[:size + 1])
+    next_cursor = None
+    if len(rows) > size:
+        next_cursor = encode_cursor(rows[size - 1], 0, key_field)
+    return rows[:size], next_cursor
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор, который листает ленту по ключу (key_field, id).
+
+    Переходы по токенам ?after= и ?before= выбирают страницу через индекс
+    без OFFSET, старые ссылки ?page=N обрабатываются штатным Paginator.
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, key_field='pub_date',
+                 **kwargs):
+        self.key_field = key_field
+        super().__init__(
+            object_list.order_by(f'-{key_field}', '-pk'), per_page, **kwargs)
+
+    def get_page(self, number, after=None, before=None):
+        page = None
+        if after:
+            page = self._seek(after, forward=True)
+        elif before:
+            page = self._seek(before, forward=False)
+        return page or super().get_page(number)
+
+    def get_elided_page_range(self, number=1, on_each_side=3, on_ends=1):
+        """Окно номеров страниц вокруг текущей и по краям.
+
+        Повторяет Paginator.get_elided_page_range из Django 3.2, чтобы
+        шаблон не выводил ссылку на каждую страницу ленты.
+        """
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    def _seek(self, token, forward):
+        """Страница после (или до) токена.
+
+        Выбирается на строку больше: по ней видно, есть ли страница
+        дальше. Номер из токена может устареть после удаления записей,
+        поэтому он только выводится.
+        """
+        cursor = decode_cursor(token)
+        if cursor is None:
+            return None
+        key, pk, number = cursor
+        rows = list(seek(
+            self.object_list, self.key_field, key, pk, forward
+        )[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows:
+            return None
+        if forward:
+            number += 1
+            has_next, has_previous = more, True
+        else:
+            rows.reverse()
+            number = number - 1 if more else 1
+            has_next, has_previous = True, more
+        number = min(max(number, 1), self.num_pages)
+        return self._get_page(
+            rows, number, self, has_next=has_next, has_previous=has_previous)
+
+    def _get_page(self, object_list, number, paginator, has_next=None,
+                  has_previous=None):
+        page = super()._get_page(list(object_list), number, paginator)
+        if has_next is not None:
+            page.has_next = lambda: has_next
+            page.has_previous = lambda: has_previous
+        page.next_cursor = page.previous_cursor = None
+        page.page_window = list(self.get_elided_page_range(number))
+        if page.object_list and page.has_next():
+            page.next_cursor = encode_cursor(
+                page.object_list[-1], number, self.key_field)
+        if page.object_list and page.has_previous():
+            page.previous_cursor = encode_cursor(
+                page.object_list[0], number, self.key_field)
+        return page
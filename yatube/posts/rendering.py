@@ -0,0 +1,54 @@
+import re
+
+from django.urls import reverse
+from django.utils.html import escape, format_html, linebreaks
+
+# @имя без точки на конце: «@ivan.» в конце фразы — это «@ivan».
+MENTION = re.compile(r'(?<![\w@])@([\w+-]+(?:\.[\w+-]+)*)')
+# Длина выдержки для карточек ленты, в символах исходного текста.
+EXCERPT_LENGTH = 300
+
+
+def extract_mentions(text):
+    """Имена пользователей, упомянутых в тексте."""
+    return set(MENTION.findall(text or ''))
+
+
+def render_text(text, usernames):
+    """Экранированный HTML текста с абзацами, как у фильтра linebreaks.
+
+    Упоминания из usernames становятся ссылками на профиль, остальные
+    остаются текстом.
+    """
+    def link(match):
+        username = match.group(1)
+        if username not in usernames:
+            return match.group(0)
+        return format_html(
+            '<a href="{}">@{}</a>',
+            reverse('posts:profile', args=(username,)),
+            username,
+        )
+    return linebreaks(MENTION.sub(link, escape(text or '')))
+
+
+def make_excerpt(text):
+    """Начало текста не длиннее EXCERPT_LENGTH, обрезанное по слову."""
+    text = (text or '').strip()
+    if len(text) <= EXCERPT_LENGTH:
+        return text
+    cut = text[:EXCERPT_LENGTH]
+    words = cut.rsplit(None, 1)
+    if not text[EXCERPT_LENGTH].isspace() and len(words) > 1:
+        cut = words[0]
+    return cut.rstrip() + '…'
+
+
+def render_post(post, usernames):
+    """Заполняет text_html и excerpt_html поста."""
+    post.text_html = render_text(post.text, usernames)
+    post.excerpt_html = render_text(make_excerpt(post.text), usernames)
+
+
+def render_comment(comment, usernames):
+    comment.text_html = render_text(comment.text, usernames)
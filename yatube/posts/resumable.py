@@ -0,0 +1,138 @@
+import os
+import re
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+
+from .models import ChunkedUpload
+from .uploads import MAX_UPLOAD_SIZE
+
+UPLOADS_DIR = 'uploads'
+MAX_CHUNK_SIZE = 5 * 1024 * 1024
+READ_SIZE = 64 * 1024
+UPLOAD_EXPIRY = timedelta(hours=24)
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    """Часть не принята, status — код ответа для клиента."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class AssembledUpload(UploadedFile):
+    """Собранный файл загрузки, который PostForm принимает как картинку.
+
+    temporary_file_path даёт ImageField открыть файл по пути, а хранилищу
+    перенести его на место без копирования.
+    """
+
+    def __init__(self, upload):
+        self.token = upload.token
+        self.path = part_path(upload.token)
+        super().__init__(
+            open(self.path, 'rb'), upload.filename, None, upload.size)
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def parts_dir():
+    return os.path.join(settings.MEDIA_ROOT, UPLOADS_DIR)
+
+
+def part_path(token):
+    return os.path.join(parts_dir(), f'{token}.part')
+
+
+def start_upload(user, filename, size):
+    if not 0 < size <= MAX_UPLOAD_SIZE:
+        raise UploadError('Недопустимый размер файла.', status=413)
+    upload = ChunkedUpload.objects.create(
+        token=uuid.uuid4().hex,
+        user=user,
+        filename=os.path.basename(filename)[:255],
+        size=size,
+    )
+    os.makedirs(parts_dir(), exist_ok=True)
+    open(part_path(upload.token), 'wb').close()
+    return upload
+
+
+def content_length(value):
+    """Длина части из заголовка Content-Length."""
+    try:
+        return int(value or 0)
+    except ValueError:
+        raise UploadError('Неверный заголовок Content-Length.')
+
+
+def receive_chunk(upload, content_range, stream, length):
+    """Дописывает часть из потока запроса во временный файл.
+
+    Часть должна начинаться с принятого offset. Если клиент оборвал
+    передачу, сохраняется всё, что успело прийти, и offset сдвигается
+    на это количество байт. Offset записывается, только если его никто
+    не сдвинул, пока часть читалась из сети.
+    """
+    match = CONTENT_RANGE.match(content_range or '')
+    if match is None:
+        raise UploadError('Нужен заголовок Content-Range.')
+    start, end, total = map(int, match.groups())
+    if total != upload.size or end < start or end >= total:
+        raise UploadError('Неверный диапазон.')
+    if end - start + 1 != length or length > MAX_CHUNK_SIZE:
+        raise UploadError('Длина части не совпадает с диапазоном.')
+    if start != upload.offset:
+        raise UploadError('Ожидается другой offset.', status=409)
+    with open(part_path(upload.token), 'r+b') as part:
+        # Хвост от прерванной записи отбрасываем: верим только offset.
+        part.truncate(start)
+        part.seek(start)
+        remaining = length
+        while remaining:
+            data = stream.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            part.write(data)
+            remaining -= len(data)
+    offset = start + length - remaining
+    moved = ChunkedUpload.objects.filter(pk=upload.pk, offset=start).update(
+        offset=offset, updated=timezone.now())
+    if not moved:
+        # Параллельный запрос успел сдвинуть offset раньше нас.
+        upload.refresh_from_db(fields=['offset'])
+        raise UploadError('Ожидается другой offset.', status=409)
+    upload.offset = offset
+    return upload
+
+
+def take_upload(user, token):
+    """Готовый файл загрузки пользователя или None."""
+    upload = ChunkedUpload.objects.filter(user=user, token=token).first()
+    if upload is None or not upload.complete:
+        return None
+    return AssembledUpload(upload)
+
+
+def remove_part(token):
+    try:
+        os.remove(part_path(token))
+    except FileNotFoundError:
+        pass
+
+
+def discard_upload(user, token):
+    """Удаляет загрузку после сохранения поста."""
+    if ChunkedUpload.objects.filter(user=user, token=token).delete()[0]:
+        remove_part(token)
+
+
+def expired_uploads(now=None):
+    return ChunkedUpload.objects.filter(
+        updated__lt=(now or timezone.now()) - UPLOAD_EXPIRY)
@@ -0,0 +1,196 @@
+import re
+from collections import namedtuple
+
+from django.db import connection, connections, transaction
+from django.utils.encoding import force_bytes, force_str
+from django.utils.html import escape
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.safestring import mark_safe
+
+# Таблица FTS5 заводится миграцией 0023_post_search. Триггеры SQLite
+# пропадают, когда миграция пересобирает таблицу постов или комментариев,
+# поэтому они восстанавливаются после каждого migrate.
+TERM = re.compile(r'\w+')
+MAX_TERMS = 8
+SNIPPET_TOKENS = 16
+MARK_START, MARK_END = '\x02', '\x03'
+
+SEARCH_SQL = f"""
+    SELECT rowid, post_id, rank,
+           snippet(posts_search, 0, char(2), char(3), '…', {SNIPPET_TOKENS})
+    FROM posts_search
+    WHERE posts_search MATCH %s {{seek}}
+    ORDER BY rank, rowid
+    LIMIT %s
+"""
+SEEK_SQL = 'AND (rank > %s OR (rank = %s AND rowid > %s))'
+
+TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_search_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_search (rowid, body, post_id)
+        VALUES (new.id, new.text, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_search_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        UPDATE posts_search SET body = new.text WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_post_search_delete
+    AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_comment_search_insert
+    AFTER INSERT ON posts_comment WHEN new.active BEGIN
+        INSERT INTO posts_search (rowid, body, post_id)
+        VALUES (-new.id, new.text, new.post_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_comment_search_update
+    AFTER UPDATE OF text, active ON posts_comment BEGIN
+        DELETE FROM posts_search WHERE rowid = -old.id;
+        INSERT INTO posts_search (rowid, body, post_id)
+        SELECT -new.id, new.text, new.post_id WHERE new.active;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_comment_search_delete
+    AFTER DELETE ON posts_comment BEGIN
+        DELETE FROM posts_search WHERE rowid = -old.id;
+    END
+    """,
+]
+
+SearchHit = namedtuple('SearchHit', 'post_id comment_id snippet')
+
+
+def install_triggers(using='default'):
+    """Создаёт недостающие триггеры, если таблица поиска уже есть."""
+    db = connections[using]
+    if 'posts_search' not in db.introspection.table_names():
+        return False
+    with db.cursor() as cursor:
+        for sql in TRIGGERS_SQL:
+            cursor.execute(sql)
+    return True
+
+
+def match_query(text):
+    """Запрос FTS5 из слов пользователя: все слова, каждое как префикс.
+
+    Префикс заменяет стемминг, которого у unicode61 нет: «кошк»
+    найдёт и «кошка», и «кошки». Кавычки и операторы FTS5 в запрос не
+    попадают, поэтому синтаксических ошибок не бывает.
+    """
+    terms = TERM.findall(text)[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и размечает найденные слова тегом <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>'))
+
+
+def encode_cursor(rank, rowid):
+    return urlsafe_base64_encode(force_bytes(f'{rank!r}|{rowid}'))
+
+
+def decode_cursor(token):
+    try:
+        rank, rowid = force_str(urlsafe_base64_decode(token)).split('|')
+        return float(rank), int(rowid)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+def search(text, size, after=None):
+    """Находки по постам и комментариям в порядке bm25 и токен дальше.
+
+    Листается по ключу (rank, rowid) без OFFSET, как лента.
+    """
+    query = match_query(text)
+    if not query:
+        return [], None
+    params = [query]
+    seek = ''
+    cursor = decode_cursor(after) if after else None
+    if cursor is not None:
+        rank, rowid = cursor
+        seek = SEEK_SQL
+        params.extend((rank, rank, rowid))
+    with connection.cursor() as db:
+        db.execute(SEARCH_SQL.format(seek=seek), params + [size + 1])
+        rows = db.fetchall()
+    hits = [
+        SearchHit(
+            post_id=post_id,
+            comment_id=-rowid if rowid < 0 else None,
+            snippet=highlight(snippet),
+        )
+        for rowid, post_id, _, snippet in rows[:size]
+    ]
+    next_cursor = None
+    if len(rows) > size:
+        rowid, _, rank, _ = rows[size - 1]
+        next_cursor = encode_cursor(rank, rowid)
+    return hits, next_cursor
+
+
+def filter_matching(posts, text):
+    """Оставляет посты, у которых совпал текст или комментарий."""
+    return posts.extra(
+        where=[
+            'posts_post.id IN (SELECT post_id FROM posts_search '
+            'WHERE posts_search MATCH %s)'
+        ],
+        params=[match_query(text) or '""'],
+    )
+
+
+def reindex_posts(start, end):
+    """Переиндексирует посты с id в (start, end] в одной транзакции."""
+    with transaction.atomic(), connection.cursor() as db:
+        db.execute(
+            'DELETE FROM posts_search WHERE rowid > %s AND rowid <= %s',
+            [start, end])
+        db.execute(
+            'INSERT INTO posts_search (rowid, body, post_id) '
+            'SELECT id, text, id FROM posts_post '
+            'WHERE id > %s AND id <= %s',
+            [start, end])
+
+
+def reindex_comments(start, end):
+    """То же для комментариев с id в (start, end]."""
+    with transaction.atomic(), connection.cursor() as db:
+        db.execute(
+            'DELETE FROM posts_search WHERE rowid >= %s AND rowid < %s',
+            [-end, -start])
+        db.execute(
+            'INSERT INTO posts_search (rowid, body, post_id) '
+            'SELECT -id, text, post_id FROM posts_comment '
+            'WHERE active AND id > %s AND id <= %s',
+            [start, end])
+
+
+def indexed_range():
+    """Самый большой и самый маленький rowid в индексе."""
+    with connection.cursor() as db:
+        db.execute('SELECT MAX(rowid), MIN(rowid) FROM posts_search')
+        return db.fetchone()
+
+
+def optimize():
+    with connection.cursor() as db:
+        db.execute(
+            "INSERT INTO posts_search (posts_search) VALUES ('optimize')")
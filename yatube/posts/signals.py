@@ -0,0 +1,189 @@
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.jobs import enqueue
+
+from . import feed, search
+from .cache import bump_generations, post_scopes
+from .images import image_metadata
+from .mentions import render_with_mentions, sync_mentions
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .rendering import render_comment, render_post
+from .stats import change_stats
+from .tags import sync_tags
+from .thumbnails import schedule_image_processing, schedule_thumbnails
+
+
+@receiver(pre_save, sender=Post)
+def post_pre_save(sender, instance, **kwargs):
+    instance._previous_group_id = instance._previous_image = None
+    instance._previous_text = None
+    if instance.pk:
+        (
+            instance._previous_group_id,
+            instance._previous_image,
+            instance._previous_text,
+        ) = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image', 'text').first()
+            or (None, None, None))
+    instance._mentioned = None
+    if instance.text != instance._previous_text or not (
+        instance.text_html and instance.excerpt_html
+    ):
+        render_with_mentions(instance, render_post)
+    if instance.image and not instance.image._committed:
+        for field, value in image_metadata(instance.image).items():
+            setattr(instance, field, value)
+        instance.image_variants_ready = False
+        instance.image_placeholder = ''
+    elif not instance.image:
+        instance.image_width = instance.image_height = None
+        instance.image_hash = instance.image_mime = ''
+        instance.image_placeholder = ''
+        instance.image_variants_ready = False
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        change_stats(instance.author_id, posts_count=1)
+        enqueue('posts.feed.fan_out_post', post_id=instance.pk)
+        sync_tags(instance, current={})
+    elif instance.text != getattr(instance, '_previous_text', None):
+        sync_tags(instance)
+    mentioned = getattr(instance, '_mentioned', None)
+    if mentioned is not None:
+        sync_mentions(
+            None if created else instance.mentions.filter(comment=None),
+            mentioned,
+            post=instance,
+            pub_date=instance.pub_date,
+        )
+    if instance.image:
+        if instance.image.name != getattr(instance, '_previous_image', None):
+            schedule_image_processing(instance)
+        elif not instance.image_variants_ready:
+            schedule_thumbnails(instance)
+    bump_generations(*post_scopes(
+        instance,
+        {instance.group_id, getattr(instance, '_previous_group_id', None)},
+    ))
+
+
+# id постов, которые сейчас удаляются: их комментарии уходят каскадом,
+# и счётчик с кэшем страниц пересчитывать для них незачем.
+deleting_posts = set()
+
+
+@receiver(pre_delete, sender=Post)
+def post_pre_delete(sender, instance, **kwargs):
+    deleting_posts.add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    deleting_posts.discard(instance.pk)
+    change_stats(instance.author_id, posts_count=-1)
+    bump_generations(*post_scopes(instance, {instance.group_id}))
+
+
+def change_comment_count(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comment_count__gte=-delta)
+    posts.update(
+        comment_count=F('comment_count') + delta, updated=timezone.now())
+
+
+def bump_comment_scopes(comment):
+    """Счётчик комментариев виден в карточках всех лент поста."""
+    post = comment.post
+    bump_generations(*post_scopes(post, {post.group_id}))
+
+
+@receiver(pre_save, sender=Comment)
+def comment_pre_save(sender, instance, **kwargs):
+    previous = None
+    if instance.pk:
+        previous = Comment.objects.filter(
+            pk=instance.pk).values_list('active', 'text').first()
+    instance._was_active = bool(previous and previous[0])
+    instance._text_changed = bool(previous and previous[1] != instance.text)
+    instance._mentioned = None
+    if previous != (instance.active, instance.text) or (
+        not instance.text_html
+    ):
+        render_with_mentions(instance, render_comment)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    was_active = getattr(instance, '_was_active', False)
+    if instance.active != was_active:
+        change_comment_count(instance.post_id, 1 if instance.active else -1)
+    elif instance.active and getattr(instance, '_text_changed', False):
+        Post.objects.filter(pk=instance.post_id).update(
+            updated=timezone.now())
+    mentioned = getattr(instance, '_mentioned', None)
+    if mentioned is not None:
+        sync_mentions(
+            None if created else instance.mentions.all(),
+            mentioned if instance.active else set(),
+            post_id=instance.post_id,
+            comment=instance,
+            pub_date=instance.created,
+        )
+    bump_comment_scopes(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id in deleting_posts:
+        return
+    if instance.active:
+        change_comment_count(instance.post_id, -1)
+    bump_comment_scopes(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        change_stats(instance.author_id, followers_count=1)
+        change_stats(instance.user_id, following_count=1)
+        feed.backfill_follow(instance)
+    bump_generations(
+        f'author:{instance.author.username}',
+        f'author:{instance.user.username}',
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_stats(instance.author_id, followers_count=-1)
+    change_stats(instance.user_id, following_count=-1)
+    feed.prune_follow(instance)
+    bump_generations(
+        f'author:{instance.author.username}',
+        f'author:{instance.user.username}',
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    bump_generations(f'group:{instance.slug}')
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == 'posts':
+        search.install_triggers(using)
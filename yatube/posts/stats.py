@@ -0,0 +1,46 @@
+from django.db.models import Count, F
+
+from .models import Follow, Post, User, UserStats
+
+
+def change_stats(user_id, **deltas):
+    """Сдвигает счётчики пользователя на deltas одним UPDATE."""
+    stats = UserStats.objects.filter(user_id=user_id)
+    for field, delta in deltas.items():
+        if delta < 0:
+            stats = stats.filter(**{f'{field}__gte': -delta})
+    stats.update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def _counts(queryset, field, user_ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': user_ids}).order_by()
+        .values_list(field).annotate(Count('pk'))
+    )
+
+
+def rebuild_stats(user_ids):
+    """Пересчитывает статистику пользователей, возвращает число изменений."""
+    user_ids = list(User.objects.filter(
+        pk__in=user_ids).values_list('pk', flat=True))
+    posts = _counts(Post.objects, 'author', user_ids)
+    followers = _counts(Follow.objects, 'author', user_ids)
+    following = _counts(Follow.objects, 'user', user_ids)
+    existing = UserStats.objects.in_bulk(user_ids)
+    changed = 0
+    for user_id in user_ids:
+        actual = {
+            'posts_count': posts.get(user_id, 0),
+            'followers_count': followers.get(user_id, 0),
+            'following_count': following.get(user_id, 0),
+        }
+        stats = existing.get(user_id)
+        if stats and all(
+            getattr(stats, field) == value for field, value in actual.items()
+        ):
+            continue
+        UserStats.objects.update_or_create(user_id=user_id, defaults=actual)
+        changed += 1
+    return changed
@@ -0,0 +1,33 @@
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from .images import file_digest, hashed_name
+
+
+@deconstructible
+class HashedStorage(FileSystemStorage):
+    """Хранит файлы по sha256 содержимого: posts/ab/cd/<sha256>.jpg.
+
+    Каталог берётся из upload_to, имя от пользователя не используется.
+    Одинаковые загрузки ложатся в один файл.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, filename = os.path.split(name)
+        name = hashed_name(
+            directory, file_digest(content), os.path.splitext(filename)[1])
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def save_exact(self, name, content):
+        """Сохраняет под заданным именем с заменой, для копий картинок."""
+        self.delete(name)
+        return super().save(name, content)
@@ -0,0 +1,50 @@
+import re
+
+from .models import PostTag, Tag
+
+# Решётка в начале слова: «#django», но не «C#» и не «##».
+HASHTAG = re.compile(r'(?<![\w#&])#(\w{1,50})')
+TAG_BATCH_SIZE = 500
+
+
+def extract_tags(text):
+    """Имена хештегов текста в нижнем регистре."""
+    return {name.lower() for name in HASHTAG.findall(text or '')}
+
+
+def tag_ids(names):
+    """id хештегов по именам, недостающие создаются."""
+    Tag.objects.bulk_create(
+        [Tag(name=name) for name in names],
+        batch_size=TAG_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return dict(
+        Tag.objects.filter(name__in=names).values_list('name', 'pk'))
+
+
+def sync_tags(post, current=None):
+    """Приводит хештеги поста к тексту, трогая только разницу.
+
+    current — уже известные {имя: id записи PostTag}, для нового поста
+    это пустой словарь, и лишний запрос не нужен.
+    """
+    names = extract_tags(post.text)
+    if current is None:
+        current = dict(
+            PostTag.objects.filter(post=post)
+            .values_list('tag__name', 'pk'))
+    removed = [pk for name, pk in current.items() if name not in names]
+    if removed:
+        PostTag.objects.filter(pk__in=removed).delete()
+    added = names - current.keys()
+    if added:
+        ids = tag_ids(added)
+        PostTag.objects.bulk_create(
+            [
+                PostTag(tag_id=ids[name], post=post, pub_date=post.pub_date)
+                for name in added
+            ],
+            ignore_conflicts=True,
+        )
+    return bool(removed or added)
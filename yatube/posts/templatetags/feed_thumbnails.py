@@ -0,0 +1,12 @@
+from django import template
+
+from posts.thumbnails import FEED_GEOMETRY, resolve_thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def load_thumbnails(page_obj, geometry=FEED_GEOMETRY):
+    """Готовит post.thumbnail для всех постов страницы сразу."""
+    resolve_thumbnails(page_obj.object_list, geometry)
+    return ''
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Job
+from posts.images import VARIANT_WIDTHS, variant_name
+from posts.models import (ChunkedUpload, Comment, Post, PostTag, User,
+                          UserStats)
+from posts.resumable import UPLOAD_EXPIRY, part_path, start_upload
+from posts.thumbnails import generate_variants
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class RebuildCommentCountsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            text='Тестовый пост',
+            author=cls.user,
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий')
+
+    def test_check_reports_drift(self):
+        """Режим --check находит расхождение и ничего не меняет."""
+        Post.objects.filter(pk=self.post.pk).update(comment_count=5)
+        out = StringIO()
+        call_command('rebuild_comment_counts', '--check', stdout=out)
+        self.assertIn('Расхождений: 1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 5)
+
+    def test_rebuild_fixes_drift(self):
+        """Команда исправляет счётчик комментариев."""
+        Post.objects.filter(pk=self.post.pk).update(comment_count=5)
+        call_command('rebuild_comment_counts', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+
+class RebuildUserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def test_rebuild_restores_stats(self):
+        """Команда создаёт и исправляет статистику пользователей."""
+        UserStats.objects.all().delete()
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).posts_count, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillImageMetadataTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_metadata_filled_on_upload(self):
+        """Размеры, хеш и MIME-тип заполняются при загрузке."""
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height), (2, 1))
+        self.assertEqual(
+            self.post.image_hash, hashlib.sha256(SMALL_GIF).hexdigest())
+        self.assertEqual(self.post.image_mime, 'image/gif')
+
+    def test_backfill_fills_missing_metadata(self):
+        """Команда заполняет метаданные постов, где их нет."""
+        Post.objects.filter(pk=self.post.pk).update(
+            image_width=None, image_height=None,
+            image_hash='', image_mime='')
+        out = StringIO()
+        call_command(
+            'backfill_image_metadata', '--workers', '1', stdout=out)
+        self.assertIn('Заполнено постов: 1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height), (2, 1))
+        self.assertEqual(self.post.image_mime, 'image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class HashedImagePathsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name='small.gif'):
+        return Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile(
+                name, SMALL_GIF, content_type='image/gif'),
+        )
+
+    def test_upload_uses_hash_path_and_dedupes(self):
+        """Одинаковые загрузки лежат в одном файле по хешу содержимого."""
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        first = self.create_post('one.gif')
+        second = self.create_post('two.GIF')
+        self.assertEqual(
+            first.image.name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)), [f'{digest}.gif'])
+
+    def test_move_command_rewrites_flat_paths(self):
+        """Команда переносит файлы из плоского каталога и меняет пути."""
+        post = self.create_post()
+        old_name = FileSystemStorage().save(
+            'posts/old.gif', ContentFile(SMALL_GIF))
+        Post.objects.filter(pk=post.pk).update(image=old_name)
+        out = StringIO()
+        call_command('move_images_to_hashed_paths', stdout=out)
+        self.assertIn('Перенесено файлов: 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, post.image.storage.save(
+            'posts/new.gif', ContentFile(SMALL_GIF)))
+        self.assertFalse(os.path.exists(
+            os.path.join(TEMP_MEDIA_ROOT, old_name)))
+        self.assertTrue(Job.objects.filter(
+            name='posts.thumbnails.generate_thumbnails',
+            payload=json.dumps({'post_id': post.pk}),
+        ).exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageVariantsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_variants_generated_and_rendered(self):
+        """Воркер делает копии и превью, лента выводит их сразу."""
+        call_command('run_jobs', once=True, workers=0, stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.image_variants_ready)
+        storage = self.post.image.storage
+        for width in VARIANT_WIDTHS:
+            for extension in ('webp', 'jpg'):
+                name = variant_name(self.post.image.name, width, extension)
+                with self.subTest(name=name):
+                    self.assertTrue(storage.exists(name))
+        response = self.client.get(reverse('posts:index'))
+        webp = storage.url(variant_name(self.post.image.name, 480, 'webp'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, f'{webp} 480w')
+        self.assertTrue(self.post.image_placeholder.startswith(
+            'data:image/jpeg;base64,'))
+        self.assertContains(response, self.post.image_placeholder)
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_variants_reset_page_cache(self):
+        """Готовые копии сразу видны на закэшированной ленте."""
+        url = reverse('posts:index')
+        self.assertNotContains(self.client.get(url), 'type="image/webp"')
+        generate_variants(self.post.pk)
+        self.assertContains(self.client.get(url), 'type="image/webp"')
+
+    def test_regenerate_command_queues_missing(self):
+        """Команда ставит в очередь посты без готовых копий или превью."""
+        Job.objects.all().delete()
+        out = StringIO()
+        call_command('regenerate_image_variants', stdout=out)
+        self.assertIn('Поставлено в очередь: 1', out.getvalue())
+        Post.objects.update(image_variants_ready=True)
+        out = StringIO()
+        call_command('regenerate_image_variants', stdout=out)
+        self.assertIn('Поставлено в очередь: 1', out.getvalue())
+        Post.objects.update(image_placeholder='data:image/jpeg;base64,')
+        out = StringIO()
+        call_command('regenerate_image_variants', stdout=out)
+        self.assertIn('Поставлено в очередь: 0', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CleanUploadsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_expired_uploads_removed(self):
+        """Брошенные загрузки удаляются вместе с файлами, свежие — нет."""
+        user = User.objects.create_user(username='auth')
+        stale = start_upload(user, 'stale.gif', 10)
+        fresh = start_upload(user, 'fresh.gif', 10)
+        ChunkedUpload.objects.filter(pk=stale.pk).update(
+            updated=timezone.now() - UPLOAD_EXPIRY * 2)
+        out = StringIO()
+        call_command('clean_uploads', stdout=out)
+        self.assertIn('Удалено загрузок: 1', out.getvalue())
+        self.assertFalse(os.path.exists(part_path(stale.token)))
+        self.assertTrue(os.path.exists(part_path(fresh.token)))
+        self.assertEqual(
+            list(ChunkedUpload.objects.values_list('pk', flat=True)),
+            [fresh.pk])
+
+
+class RebuildSearchIndexTest(TestCase):
+    def indexed(self):
+        with connection.cursor() as db:
+            db.execute('SELECT rowid, body FROM posts_search ORDER BY rowid')
+            return db.fetchall()
+
+    def test_rebuild_restores_index(self):
+        """Команда восстанавливает испорченный индекс порциями."""
+        user = User.objects.create_user(username='auth')
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=user)
+            for i in range(3)
+        ]
+        comment = Comment.objects.create(
+            post=posts[0], author=user, text='Комментарий')
+        Comment.objects.create(
+            post=posts[0], author=user, text='Скрытый', active=False)
+        expected = self.indexed()
+        with connection.cursor() as db:
+            db.execute('DELETE FROM posts_search WHERE rowid = %s',
+                       [posts[1].pk])
+            db.execute(
+                'INSERT INTO posts_search (rowid, body, post_id) '
+                'VALUES (%s, %s, %s)', [posts[2].pk + 10, 'Лишний', 0])
+        call_command('rebuild_search_index', chunk_size=2, stdout=StringIO())
+        self.assertEqual(self.indexed(), expected)
+        self.assertIn((-comment.pk, 'Комментарий'), expected)
+        self.assertEqual(len(expected), 4)
+
+
+class BackfillTagsTest(TestCase):
+    def test_tags_backfilled(self):
+        """Команда добавляет недостающие хештеги и убирает лишние."""
+        user = User.objects.create_user(username='auth')
+        posts = [
+            Post.objects.create(text=f'Пост {i} #тег{i} #общий', author=user)
+            for i in range(3)
+        ]
+        PostTag.objects.filter(post=posts[0]).delete()
+        Post.objects.filter(pk=posts[1].pk).update(text='Без хештегов')
+        out = StringIO()
+        call_command('backfill_tags', chunk_size=2, stdout=out)
+        self.assertIn('Обновлено хештегов: 4', out.getvalue())
+        self.assertEqual(
+            set(PostTag.objects.values_list('post_id', 'tag__name')),
+            {
+                (posts[0].pk, 'тег0'), (posts[0].pk, 'общий'),
+                (posts[2].pk, 'тег2'), (posts[2].pk, 'общий'),
+            })
+
+
+class RenderTextsTest(TestCase):
+    def test_texts_rendered(self):
+        """Команда заполняет HTML и связывает упоминания новых людей."""
+        author = User.objects.create_user(username='auth')
+        post = Post.objects.create(text='Привет, @newbie', author=author)
+        comment = Comment.objects.create(
+            post=post, author=author, text='Пока, @newbie')
+        Post.objects.update(text_html='', excerpt_html='')
+        User.objects.create_user(username='newbie')
+        out = StringIO()
+        call_command('render_texts', chunk_size=1, stdout=out)
+        self.assertIn('Перерендерено записей: 2', out.getvalue())
+        post.refresh_from_db()
+        comment.refresh_from_db()
+        link = '<a href="{}">@newbie</a>'.format(
+            reverse('posts:profile', args=('newbie',)))
+        self.assertIn(link, post.text_html)
+        self.assertIn(link, post.excerpt_html)
+        self.assertIn(link, comment.text_html)
+        newbie = User.objects.get(username='newbie')
+        self.assertEqual(
+            set(newbie.mentions.values_list('post', 'comment')),
+            {(post.pk, None), (post.pk, comment.pk)})
+
+
+class BenchmarkFeedTest(TestCase):
+    def test_benchmark_rolls_back_seed(self):
+        """Замер печатает оба варианта и не оставляет временных постов."""
+        out = StringIO()
+        call_command(
+            'benchmark_feed', seed=5, pages=1, page_size=5, stdout=out)
+        self.assertIn('Полные модели:', out.getvalue())
+        self.assertIn('Карточки:', out.getvalue())
+        self.assertFalse(Post.objects.exists())
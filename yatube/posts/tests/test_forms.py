@@ -1,9 +1,38 @@
+import shutil
+import struct
+import tempfile
+import zlib
 from http import HTTPStatus
+from io import BytesIO
+from unittest import mock
 
-from django.test import Client, TestCase
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
-from posts.models import Post, Group, User
+from posts.models import Comment, Post, Group, User
+from posts.thumbnails import process_image
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def png_chunk(kind, data):
+    return (
+        struct.pack('>I', len(data)) + kind + data
+        + struct.pack('>I', zlib.crc32(kind + data))
+    )
+
+
+def png_header(width, height):
+    """PNG с заданными размерами в заголовке и почти без пикселей."""
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (
+        b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', ihdr)
+        + png_chunk(b'IDAT', zlib.compress(b'\x00'))
+        + png_chunk(b'IEND', b'')
+    )
 
 
 class PostFormTests(TestCase):
@@ -144,3 +173,80 @@ class PostFormTests(TestCase):
         self.assertEqual(test_post.text, 'Текст поста для редактирования')
         self.assertEqual(test_post.author, self.post_author)
         self.assertEqual(test_post.group, self.group)
+
+    def test_comment_count_updated(self):
+        """Счётчик комментариев меняется при добавлении и удалении."""
+        post = Post.objects.create(
+            text='Пост для комментариев',
+            author=self.post_author,
+        )
+        self.authorized_user.post(
+            reverse('posts:add_comment', args=(post.id,)),
+            data={'text': 'Комментарий'},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        Comment.objects.get(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, name, content, content_type):
+        return self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content, content_type),
+        })
+
+    def test_oversized_upload_rejected(self):
+        """Файл больше лимита обрывается при приёме и не сохраняется."""
+        with mock.patch('posts.uploads.MAX_UPLOAD_SIZE', 16):
+            response = self.upload('big.png', png_header(2, 1), 'image/png')
+        self.assertFormError(
+            response, 'form', 'image', 'Файл слишком большой.')
+        self.assertFalse(Post.objects.exists())
+
+    def test_pixel_bomb_rejected_by_header(self):
+        """Картинка с огромными размерами отсекается по заголовку."""
+        with mock.patch.object(Image.Image, 'load') as load:
+            response = self.upload(
+                'bomb.png', png_header(10000, 10000), 'image/png')
+        load.assert_not_called()
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'too_many_pixels'))
+        self.assertFalse(Post.objects.exists())
+
+    def test_exif_stripped_in_background(self):
+        """Обработка в фоне перекодирует JPEG без EXIF."""
+        exif = Image.Exif()
+        exif[0x010f] = 'Камера'
+        buffer = BytesIO()
+        Image.new('RGB', (4, 2), 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes())
+        self.upload('photo.jpg', buffer.getvalue(), 'image/jpeg')
+        post = Post.objects.get()
+        old_name = post.image.name
+        with Image.open(post.image.path) as image:
+            self.assertIn('exif', image.info)
+        process_image(post.pk)
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post.image.storage.exists(old_name))
+        with Image.open(post.image.path) as image:
+            self.assertNotIn('exif', image.info)
+            self.assertEqual(image.size, (4, 2))
@@ -1,6 +1,12 @@
+from unittest import skipUnless
+
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from posts.models import Comment, Follow, Post, Group, User, CHARACTER_LIMIT
+from posts.feed import card_entries, card_posts
+from posts.paginator import KEYSET_ORDERING, seek
 
 
 class PostModelTest(TestCase):
@@ -85,6 +91,11 @@ class FollowModelTest(TestCase):
             f'{self.follow.user} подписался на {self.follow.author}',
             str(self.follow))
 
+    def test_follow_unique(self):
+        """Повторная подписка на автора запрещена."""
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.user1, author=self.user2)
+
     def test_follow_verbose_name(self):
         """Проверка verbose_name у follow."""
         field_verboses = {
@@ -130,3 +141,91 @@ class CommentModelTest(TestCase):
             with self.subTest(value=value):
                 verbose_name = self.comment._meta.get_field(value).verbose_name
                 self.assertEqual(verbose_name, expected)
+
+    def test_post_delete_cost_independent_of_comments(self):
+        """Удаление поста не пересчитывает счётчик на каждый комментарий."""
+        queries = []
+        for count in (1, 10):
+            post = Post.objects.create(text='Пост', author=self.user)
+            for i in range(count):
+                Comment.objects.create(
+                    text=f'Комментарий {i}', author=self.user, post=post)
+            with CaptureQueriesContext(connection) as context:
+                post.delete()
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class FeedQueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def get_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_feeds_use_index_without_sorting(self):
+        """Ленты читаются по индексу без временного B-tree."""
+        feeds = {
+            'index': Post.objects.order_by(*KEYSET_ORDERING),
+            'group_list': self.group.posts.select_related(
+                'author', 'group').order_by(*KEYSET_ORDERING),
+            'profile': self.user.posts.select_related(
+                'group').order_by(*KEYSET_ORDERING),
+            'follow_index': self.user.feed.select_related(
+                'post__author', 'post__group').order_by(*KEYSET_ORDERING),
+            'comments': self.post.comments.filter(
+                active=True).order_by('-created', '-pk'),
+        }
+        for name, queryset in feeds.items():
+            with self.subTest(feed=name):
+                plan = self.get_plan(queryset[:10])
+                self.assertTrue(
+                    any('USING INDEX' in step
+                        or 'USING COVERING INDEX' in step
+                        for step in plan),
+                    plan)
+                self.assertFalse(
+                    any('TEMP B-TREE' in step for step in plan), plan)
+
+    def test_seek_bounds_index_range(self):
+        """Переход по токену ищет по индексу с границей по дате."""
+        key = self.post.pub_date
+        feeds = {
+            'index': (card_posts(Post.objects.all()), 'pub_date'),
+            'group_list': (card_posts(self.group.posts.all()), 'pub_date'),
+            'profile': (card_posts(self.user.posts.all()), 'pub_date'),
+            'follow_index': (
+                card_entries(self.user.feed.all(), 'user'), 'pub_date'),
+            'comments': (
+                self.post.comments.filter(active=True), 'created'),
+        }
+        for name, (queryset, field) in feeds.items():
+            queryset = queryset.order_by(f'-{field}', '-pk')
+            for forward, sign in ((True, '<'), (False, '>')):
+                with self.subTest(feed=name, forward=forward):
+                    plan = self.get_plan(
+                        seek(queryset, field, key, self.post.pk,
+                             forward)[:10])
+                    self.assertTrue(
+                        any(f'{field}{sign}?' in step for step in plan),
+                        plan)
+                    self.assertFalse(
+                        any('TEMP B-TREE' in step for step in plan), plan)
@@ -1,17 +1,45 @@
+import io
+import json
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
+from django.core.paginator import Page
 from django.core.files.uploadedfile import SimpleUploadedFile
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile, serialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
 
-from posts.models import Follow, Post, Group, User
+from core.models import Job
+from core.queries import QueryBudgetTestMixin
+from posts.models import (ChunkedUpload, Comment, FeedEntry, Follow,
+                          Mention, Post, PostTag, Group, User, UserStats)
+from ..feed import pull_posts
 from ..forms import PostForm
+from ..mentions import render_with_mentions
+from ..rendering import render_post
+from ..resumable import UploadError, receive_chunk, take_upload
+from ..paginator import KeysetPaginator
+from ..thumbnails import (FEED_GEOMETRY, THUMBNAIL_GEOMETRIES,
+                          QueuedThumbnailBackend, Thumbnail,
+                          resolve_thumbnails)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 class PostPagesTests(TestCase):
@@ -24,17 +52,9 @@ class PostPagesTests(TestCase):
             slug='test-slug',
             description='Тестовое описание группы',
         )
-        small_gif = (
-            b'\x47\x49\x46\x38\x39\x61\x02\x00'
-            b'\x01\x00\x80\x00\x00\x00\x00\x00'
-            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
-            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
-            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
-            b'\x0A\x00\x3B'
-        )
         uploaded = SimpleUploadedFile(
             name='small.gif',
-            content=small_gif,
+            content=SMALL_GIF,
             content_type='image/gif'
         )
         cls.post = Post.objects.create(
@@ -125,6 +145,70 @@ class PostPagesTests(TestCase):
         self.assertEqual(test_post.group, self.post.group)
         self.assertEqual(test_post.image, self.post.image)
 
+    def test_image_post_queues_processing(self):
+        """Пост с картинкой ставит в очередь её обработку."""
+        self.assertTrue(Job.objects.filter(
+            name='posts.thumbnails.process_image',
+            payload=json.dumps({'post_id': self.post.id}),
+            status=Job.PENDING,
+        ).exists())
+
+    def test_thumbnail_falls_back_to_original(self):
+        """Пока миниатюры нет, страница показывает оригинал картинки."""
+        with mock.patch('posts.thumbnails.default.engine') as engine:
+            response = self.client.get(
+                reverse('posts:post_detail', args=(self.post.id,)))
+        engine.get_image.assert_not_called()
+        self.assertContains(response, self.post.image.url)
+
+    def test_image_dimensions_rendered(self):
+        """Шаблоны выводят размеры картинки из полей поста."""
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:post_detail', args=(self.post.id,)),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'width="2" height="1"')
+
+    def test_feed_thumbnails_resolved_in_one_lookup(self):
+        """Миниатюры страницы берутся из хранилища одним запросом."""
+        name = QueuedThumbnailBackend().thumbnail_name(
+            ImageFile(self.post.image), FEED_GEOMETRY,
+            THUMBNAIL_GEOMETRIES[FEED_GEOMETRY])
+        thumbnail = ImageFile(name, default.storage)
+        thumbnail.set_size((960, 339))
+        default.kvstore.set(thumbnail)
+        cache.clear()
+        other = Post.objects.create(text='Без картинки', author=self.user)
+        posts = [self.post, other]
+        with self.assertNumQueries(1):
+            resolve_thumbnails(posts)
+        with self.assertNumQueries(0):
+            resolve_thumbnails(posts)
+        self.assertEqual(
+            self.post.thumbnail, Thumbnail(thumbnail.url, 960, 339))
+        self.assertIsNone(other.thumbnail)
+
+    def test_thumbnail_miss_cached_briefly(self):
+        """Отсутствие миниатюры кэшируется на THUMBNAIL_MISS_TIMEOUT."""
+        name = QueuedThumbnailBackend().thumbnail_name(
+            ImageFile(self.post.image), FEED_GEOMETRY,
+            THUMBNAIL_GEOMETRIES[FEED_GEOMETRY])
+        thumbnail = ImageFile(name, default.storage)
+        thumbnail.set_size((960, 339))
+        cache.clear()
+        with mock.patch('posts.thumbnails.THUMBNAIL_MISS_TIMEOUT', 0):
+            resolve_thumbnails([self.post])
+            self.assertEqual(self.post.thumbnail.url, self.post.image.url)
+            # Воркер с другим кэшем видно только через базу.
+            KVStoreModel.objects.create(
+                key=add_prefix(thumbnail.key),
+                value=serialize_image_file(thumbnail))
+            resolve_thumbnails([self.post])
+        self.assertEqual(
+            self.post.thumbnail, Thumbnail(thumbnail.url, 960, 339))
+
     def test_create_and_edit_post_page_show_correct_context(self):
         """Шаблон create_post и edit_post
         сформирован с правильным контекстом."""
@@ -167,6 +251,7 @@ class PaginatorViewsTest(TestCase):
 
     def setUp(self):
         self.unauthorized_client = Client()
+        cache.clear()
 
     def test_paginator_on_pages(self):
         """Проверка пагинации на страницах."""
@@ -188,8 +273,58 @@ class PaginatorViewsTest(TestCase):
                     posts_on_second_page
                 )
 
+    def test_paginator_cursor_navigation(self):
+        """Проверка перехода по токенам after и before."""
+        url = reverse('posts:index')
+        first_page = self.unauthorized_client.get(url).context['page_obj']
+        second_page = self.unauthorized_client.get(
+            url, {'after': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(second_page.number, 2)
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(
+            set(first_page.object_list) & set(second_page.object_list))
+        back_page = self.unauthorized_client.get(
+            url, {'before': second_page.previous_cursor}).context['page_obj']
+        self.assertEqual(back_page.number, 1)
+        self.assertEqual(back_page.object_list, first_page.object_list)
+
+    def test_paginator_cursor_after_deleted_rows(self):
+        """Ссылка «Следующая» есть, пока после страницы остаются посты."""
+        posts = list(Post.objects.order_by('-pub_date', '-pk'))
+        paginator = KeysetPaginator(Post.objects.all(), 3)
+        page = paginator.get_page(1)
+        page = paginator.get_page(None, after=page.next_cursor)
+        Post.objects.filter(
+            pk__in=[post.pk for post in posts[:6]]).delete()
+        paginator = KeysetPaginator(Post.objects.all(), 3)
+        pages = []
+        while page.has_next():
+            page = paginator.get_page(None, after=page.next_cursor)
+            pages.append(page.object_list)
+        self.assertEqual(pages, [posts[6:9], posts[9:12], posts[12:]])
+        self.assertEqual(type(page), Page)
+
+    def test_paginator_page_window(self):
+        """Пагинатор выводит только окно страниц вокруг текущей."""
+        paginator = KeysetPaginator(Post.objects.all(), 1)
+        page = paginator.get_page(7)
+        ellipsis = paginator.ELLIPSIS
+        self.assertEqual(
+            page.page_window,
+            [1, ellipsis, 4, 5, 6, 7, 8, 9, 10, ellipsis, 13])
+        response = self.unauthorized_client.get(
+            reverse('posts:index'), {'page': 1})
+        self.assertEqual(
+            response.context['page_obj'].page_window, [1, 2])
 
-class FollowViewsTest(TestCase):
+    def test_paginator_bad_cursor(self):
+        """Испорченный токен открывает первую страницу."""
+        response = self.unauthorized_client.get(
+            reverse('posts:index'), {'after': 'broken'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+
+class FollowViewsTest(QueryBudgetTestMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -256,6 +391,137 @@ class FollowViewsTest(TestCase):
             reverse('posts:follow_index'))
         self.assertNotIn(post, response.context['page_obj'].object_list)
 
+    def test_new_post_added_to_followers_feed(self):
+        """Новый пост раскладывает по лентам подписчиков воркер."""
+        Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        post = Post.objects.create(
+            author=self.post_autor,
+            text='Новый пост')
+        self.assertFalse(post.fanned_out)
+        call_command(
+            'run_jobs', once=True, workers=0, stdout=io.StringIO())
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.post_follower, post=post).exists())
+        post.refresh_from_db()
+        self.assertTrue(post.fanned_out)
+
+    def test_pending_post_pulled_on_read(self):
+        """Пост, который воркер ещё не разослал, виден в ленте сразу."""
+        Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        post = Post.objects.create(
+            author=self.post_autor,
+            text='Новый пост')
+        response = self.assertWithinQueryBudget(
+            self.author_client, reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'].object_list)
+
+    def test_unfollow_prunes_feed(self):
+        """После отписки посты автора удаляются из ленты."""
+        follow = Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        self.assertTrue(self.post_follower.feed.exists())
+        follow.delete()
+        self.assertFalse(self.post_follower.feed.exists())
+
+    def test_follow_updates_stats(self):
+        """Подписка и новый пост меняют статистику пользователей."""
+        Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        Post.objects.create(author=self.post_autor, text='Ещё пост')
+        response = self.author_client.get(
+            reverse('posts:profile', args=(self.post_autor.username,)))
+        stats = response.context['author'].stats
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(UserStats.objects.get(
+            user=self.post_follower).following_count, 1)
+
+    def test_follow_resets_follower_profile_cache(self):
+        """Подписка сбрасывает кэш профиля подписчика со счётчиком."""
+        url = reverse('posts:profile', args=(self.post_follower.username,))
+        response = self.client.get(url)
+        Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        self.assertNotEqual(response.content, self.client.get(url).content)
+
+    def test_popular_author_pulled_on_read(self):
+        """Посты популярного автора подтягиваются в ленту при чтении."""
+        with mock.patch('posts.feed.FEED_FANOUT_LIMIT', 0):
+            Follow.objects.create(
+                user=self.post_follower,
+                author=self.post_autor)
+            post = Post.objects.create(
+                author=self.post_autor,
+                text='Пост популярного автора')
+            self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+            response = self.assertWithinQueryBudget(
+                self.author_client, reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'].object_list)
+
+    def test_popular_author_with_many_followers_pulled(self):
+        """Все посты популярного автора попадают в ленту без повторов."""
+        for i in range(5):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'reader_{i}'),
+                author=self.post_autor)
+        with mock.patch('posts.feed.FEED_FANOUT_LIMIT', 2), \
+                mock.patch('posts.feed.FEED_BACKFILL_LIMIT', 3):
+            Follow.objects.create(
+                user=self.post_follower,
+                author=self.post_autor)
+            posts = [
+                Post.objects.create(author=self.post_autor, text=f'Пост {i}')
+                for i in range(4)
+            ]
+            call_command(
+                'run_jobs', once=True, workers=0, stdout=io.StringIO())
+            for _ in range(2):
+                pull_posts(self.post_follower)
+        self.assertEqual(
+            set(self.post_follower.feed.values_list('post', flat=True)),
+            {self.post.pk, *(post.pk for post in posts)})
+
+
+class CommentsViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+        for i in range(25):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий #{i}')
+        cls.hidden = Comment.objects.create(
+            post=cls.post, author=cls.user, text='Скрытый', active=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_loaded_by_chunks(self):
+        """Комментарии выводятся порциями, скрытые не показываются."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id,)))
+        first_chunk = response.context['comments']
+        self.assertEqual(len(first_chunk), 20)
+        self.assertNotIn(self.hidden, first_chunk)
+        self.assertEqual(response.context['post'].comment_count, 25)
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.id,)),
+            {'after': response.context['comments_cursor']})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        second_chunk = response.context['comments']
+        self.assertEqual(len(second_chunk), 5)
+        self.assertIsNone(response.context['comments_cursor'])
+        self.assertFalse(set(first_chunk) & set(second_chunk))
+        self.assertNotIn(self.hidden, second_chunk)
+
 
 class CacheTests(TestCase):
     @classmethod
@@ -275,11 +541,569 @@ class CacheTests(TestCase):
 
     def test_cache_index_page(self):
         """Тест кэширования страницы index.html."""
-        test_post = Post.objects.create(author=CacheTests.user)
         response = self.client.get(reverse('posts:index'))
-        test_post.delete()
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Без сигналов', excerpt_html='<p>Без сигналов</p>')
         response_2 = self.client.get(reverse('posts:index'))
         self.assertEqual(response.content, response_2.content)
         cache.clear()
         response_3 = self.client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, response_3.content)
+
+    def test_cache_invalidated_on_write(self):
+        """Кэш страниц сбрасывается сразу после изменения поста."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+        )
+        responses = {url: self.client.get(url) for url in urls}
+        self.post.text = 'Отредактированный пост'
+        self.post.save()
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                self.assertNotEqual(
+                    response.content, self.client.get(url).content)
+
+    def test_cache_invalidated_on_comment(self):
+        """Новый комментарий сбрасывает кэш поста и лент с его карточкой."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+        )
+        responses = {url: self.client.get(url) for url in urls}
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                self.assertNotEqual(
+                    response.content, self.client.get(url).content)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ChunkedUploadTest(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def start(self):
+        response = self.authorized_client.post(
+            reverse('posts:upload_start'),
+            {'filename': 'small.gif', 'size': len(SMALL_GIF)},
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()['token']
+
+    def put(self, token, start, end):
+        return self.authorized_client.put(
+            reverse('posts:upload_chunk', args=(token,)),
+            data=SMALL_GIF[start:end],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(SMALL_GIF)}',
+        )
+
+    def test_upload_resumes_and_creates_post(self):
+        """Загрузка продолжается с offset, пост создаётся по токену."""
+        token = self.start()
+        self.assertEqual(self.put(token, 0, 20).json()['offset'], 20)
+        retry = self.put(token, 10, 30)
+        self.assertEqual(retry.status_code, 409)
+        self.assertEqual(retry.json()['offset'], 20)
+        status = self.authorized_client.get(
+            reverse('posts:upload_chunk', args=(token,))).json()
+        self.put(token, status['offset'], len(SMALL_GIF))
+        self.assertWithinQueryBudget(
+            self.authorized_client, reverse('posts:post_create'), 'post', {
+                'text': 'Пост из загрузки по частям',
+                'upload_token': token,
+            })
+        post = Post.objects.get(author=self.user)
+        with post.image.open('rb') as image:
+            self.assertEqual(image.read(), SMALL_GIF)
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+    def test_upload_file_closed(self):
+        """Файл загрузки закрывается и при сохранении, и при ошибке формы."""
+        uploads = []
+
+        def remember_upload(user, token):
+            uploads.append(take_upload(user, token))
+            return uploads[-1]
+
+        for text in ('', 'Пост из загрузки'):
+            token = self.start()
+            self.put(token, 0, len(SMALL_GIF))
+            with mock.patch('posts.views.take_upload', remember_upload):
+                self.authorized_client.post(reverse('posts:post_create'), {
+                    'text': text,
+                    'upload_token': token,
+                })
+        self.assertEqual(len(uploads), 2)
+        self.assertTrue(all(upload.closed for upload in uploads))
+        self.assertEqual(
+            list(ChunkedUpload.objects.values_list('token', flat=True)),
+            [uploads[0].token])
+
+    def test_incomplete_upload_rejected(self):
+        """Недокачанная или чужая загрузка — ошибка формы, а не пост."""
+        token = self.start()
+        self.put(token, 0, 20)
+        for upload_token in (token, 'unknown'):
+            with self.subTest(upload_token=upload_token):
+                response = self.authorized_client.post(
+                    reverse('posts:post_create'), {
+                        'text': 'Пост без картинки',
+                        'upload_token': upload_token,
+                    })
+                self.assertFormError(
+                    response, 'form', 'image',
+                    'Загрузка не найдена или ещё не завершена.')
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(ChunkedUpload.objects.filter(token=token).exists())
+
+    def test_upload_kept_when_file_sent(self):
+        """Загрузка не удаляется, если пост сохранён с обычным файлом."""
+        token = self.start()
+        self.put(token, 0, len(SMALL_GIF))
+        self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'Пост с обычным файлом',
+            'upload_token': token,
+            'image': SimpleUploadedFile(
+                'other.gif', SMALL_GIF, content_type='image/gif'),
+        })
+        self.assertTrue(Post.objects.filter(author=self.user).exists())
+        self.assertTrue(ChunkedUpload.objects.filter(token=token).exists())
+
+    def test_concurrent_chunk_not_committed(self):
+        """Часть не сдвигает offset, который уже сдвинул другой запрос."""
+        token = self.start()
+        upload = ChunkedUpload.objects.get(token=token)
+        ChunkedUpload.objects.filter(pk=upload.pk).update(offset=20)
+        with self.assertRaises(UploadError) as raised:
+            receive_chunk(
+                upload, f'bytes 0-9/{len(SMALL_GIF)}',
+                io.BytesIO(SMALL_GIF[:10]), 10)
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(upload.offset, 20)
+        self.assertEqual(ChunkedUpload.objects.get(pk=upload.pk).offset, 20)
+
+    def test_bad_content_length_rejected(self):
+        """Испорченный Content-Length — ответ 400, а не ошибка сервера."""
+        token = self.start()
+        response = self.authorized_client.put(
+            reverse('posts:upload_chunk', args=(token,)),
+            data=SMALL_GIF[:10],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-9/{len(SMALL_GIF)}',
+            CONTENT_LENGTH='десять',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], 0)
+
+    def test_foreign_token_ignored(self):
+        """Чужой токен загрузки не принимается."""
+        token = self.start()
+        other = Client()
+        other.force_login(User.objects.create_user(username='other'))
+        response = other.get(reverse('posts:upload_chunk', args=(token,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_upload_within_query_budget(self):
+        """Загрузка по частям укладывается в бюджет SQL-запросов."""
+        self.assertWithinQueryBudget(
+            self.authorized_client, reverse('posts:upload_start'), 'post',
+            {'filename': 'small.gif', 'size': len(SMALL_GIF)})
+        token = self.start()
+        self.assertWithinQueryBudget(
+            self.authorized_client,
+            reverse('posts:upload_chunk', args=(token,)))
+        with self.settings(QUERY_BUDGET_STRICT=True):
+            self.assertEqual(self.put(token, 0, 20).status_code, 200)
+
+
+class QueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы',
+        )
+        cls.users = [
+            User.objects.create_user(username=f'user_{i}') for i in range(5)
+        ]
+        cls.author, cls.reader = cls.users[:2]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for user in cls.users:
+            cls.post = Post.objects.create(
+                text='Тестовый пост',
+                author=cls.author,
+                group=cls.group,
+            )
+            Post.objects.create(
+                text='Пост другого автора',
+                author=user,
+                group=cls.group,
+            )
+            Comment.objects.create(
+                post=cls.post, author=user, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_views_within_query_budget(self):
+        """Все страницы posts укладываются в бюджет SQL-запросов."""
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+            reverse('posts:post_comments', args=(self.post.id,)),
+            reverse('posts:post_create'),
+            reverse('posts:post_edit', args=(self.post.id,)),
+            reverse('posts:follow_index'),
+            reverse('posts:post_search') + '?q=Тестовый',
+        ]
+        for client in (self.client, self.author_client, self.reader_client):
+            for url in pages:
+                with self.subTest(url=url):
+                    self.assertWithinQueryBudget(client, url)
+
+    def test_actions_within_query_budget(self):
+        """Действия с постами укладываются в бюджет SQL-запросов."""
+        actions = [
+            (reverse('posts:post_create'), {'text': 'Новый пост'}),
+            (reverse('posts:post_edit', args=(self.post.id,)),
+             {'text': 'Исправленный пост', 'group': self.group.id}),
+            (reverse('posts:add_comment', args=(self.post.id,)),
+             {'text': 'Комментарий'}),
+        ]
+        for url, data in actions:
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(
+                    self.author_client, url, 'post', data)
+        for name in ('posts:profile_follow', 'posts:profile_unfollow'):
+            with self.subTest(url=name):
+                self.assertWithinQueryBudget(
+                    self.author_client,
+                    reverse(name, args=(self.users[2].username,)))
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group)
+        cls.pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(cls.group.slug,)),
+            reverse('posts:profile', args=(cls.author.username,)),
+            reverse('posts:post_detail', args=(cls.post.id,)),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def edit_post(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+
+    def edit_comment(self):
+        comment = Comment.objects.get(post=self.post)
+        comment.text = 'Исправленный комментарий'
+        comment.save()
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        return etag, client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_not_modified(self):
+        """Неизменённая страница отдаёт 304 без рендера шаблона."""
+        for client in (self.client, self.reader_client):
+            for url in self.pages:
+                with self.subTest(url=url):
+                    response = client.get(url)
+                    self.assertTrue(response.has_header('Last-Modified'))
+                    _, response = self.revalidate(client, url)
+                    self.assertEqual(response.status_code, 304)
+                    self.assertEqual(response.templates, [])
+        etag = self.client.get(self.pages[0])['ETag']
+        with self.assertNumQueries(1):
+            self.client.get(self.pages[0], HTTP_IF_NONE_MATCH=etag)
+
+    def test_changes_reset_etag(self):
+        """Новый пост, правка, комментарий или подписка меняют ETag."""
+        changes = (
+            (self.pages[0], lambda: Post.objects.create(
+                text='Новый пост', author=self.reader)),
+            (self.pages[1], self.edit_post),
+            (self.pages[2], lambda: Follow.objects.create(
+                user=self.reader, author=self.author)),
+            (self.pages[3], lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий')),
+            (self.pages[3], self.edit_comment),
+        )
+        for url, change in changes:
+            with self.subTest(url=url):
+                etag = self.reader_client.get(url)['ETag']
+                change()
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertNotEqual(response.status_code, 304)
+
+    def test_etag_depends_on_viewer(self):
+        """Гость и пользователь получают разные ETag одной страницы."""
+        for url in self.pages:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            text='Кошки <b>гуляют</b> по крышам', author=cls.user)
+        cls.other = Post.objects.create(
+            text='Собаки спят', author=cls.user)
+        cls.comment = Comment.objects.create(
+            post=cls.other, author=cls.user, text='А кошка дома')
+        cls.url = reverse('posts:post_search')
+
+    def search(self, query, **params):
+        return self.client.get(self.url, {'q': query, **params})
+
+    def test_finds_posts_and_comments(self):
+        """Поиск по префиксу находит и посты, и комментарии."""
+        response = self.search('кошк')
+        found = {
+            (post.pk, hit.comment_id)
+            for hit, post in response.context['results']
+        }
+        self.assertEqual(
+            found, {(self.post.pk, None), (self.other.pk, self.comment.pk)})
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        """Во фрагменте разметка поста экранирована, слово выделено."""
+        response = self.search('гуляют')
+        hit, _ = response.context['results'][0]
+        self.assertIn('<mark>гуляют</mark>', hit.snippet)
+        self.assertIn('&lt;b&gt;', hit.snippet)
+
+    def test_index_follows_changes(self):
+        """Правка поста и скрытие комментария сразу видны в поиске."""
+        self.post.text = 'Птицы летают'
+        self.post.save()
+        Comment.objects.filter(pk=self.comment.pk).update(active=False)
+        self.assertEqual(self.search('кошк').context['results'], [])
+        self.assertEqual(len(self.search('птиц').context['results']), 1)
+
+    def test_keyset_pages(self):
+        """Результаты листаются токеном after без повторов."""
+        for i in range(3):
+            Post.objects.create(text=f'Кошка номер {i}', author=self.user)
+        with mock.patch('posts.views.SEARCH_RESULTS', 2):
+            seen = []
+            after = ''
+            while True:
+                response = self.search('кошк', after=after)
+                seen.extend(
+                    hit for hit, _ in response.context['results'])
+                after = response.context['next_cursor']
+                if not after:
+                    break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_operators_are_not_syntax(self):
+        """Кавычки и операторы FTS5 в запросе не ломают поиск."""
+        for query in ('"', 'NOT', 'кошк*) OR (', ''):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query).status_code, 200)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через индекс и находит по комментарию."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кошк'})
+        self.assertEqual(
+            set(response.context['cl'].result_list),
+            {self.post, self.other})
+
+
+class TagTest(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tags(self, post):
+        return set(post.post_tags.values_list('tag__name', flat=True))
+
+    def test_tags_parsed_on_save(self):
+        """Хештеги разбираются при создании поста, без C# и ##."""
+        post = Post.objects.create(
+            text='#Django и #python, но не C# и не ##двойной',
+            author=self.user,
+        )
+        self.assertEqual(self.tags(post), {'django', 'python'})
+
+    def test_edit_changes_only_difference(self):
+        """Правка через post_edit меняет только изменившиеся хештеги."""
+        post = Post.objects.create(text='#один #два', author=self.user)
+        kept = PostTag.objects.get(post=post, tag__name='один')
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=(post.id,)),
+            {'text': '#один #три'},
+        )
+        self.assertEqual(self.tags(post), {'один', 'три'})
+        self.assertTrue(PostTag.objects.filter(pk=kept.pk).exists())
+
+    def test_tag_page(self):
+        """Страница хештега показывает его посты, новые сверху."""
+        old = Post.objects.create(text='Старый #новости', author=self.user)
+        new = Post.objects.create(text='Свежие #Новости', author=self.user)
+        Post.objects.create(text='Без хештега', author=self.user)
+        url = reverse('posts:tag_list', args=('новости',))
+        response = self.assertWithinQueryBudget(self.client, url)
+        self.assertTemplateUsed(response, 'posts/tag_list.html')
+        self.assertEqual(list(response.context['page_obj']), [new, old])
+        response = self.client.get(reverse('posts:tag_list', args=('нет',)))
+        self.assertEqual(response.status_code, 404)
+
+
+class MentionTest(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.ivan = User.objects.create_user(username='ivan')
+        cls.anna = User.objects.create_user(username='anna.k')
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def mentioned(self, **filters):
+        return set(Mention.objects.filter(**filters).values_list(
+            'user__username', flat=True))
+
+    def test_links_rendered_at_save(self):
+        """Упоминания становятся ссылками одним запросом при сохранении."""
+        post = Post(
+            text='Привет, @ivan и @anna.k. А @nobody <b>нет</b>',
+            author=self.author)
+        with self.assertNumQueries(1):
+            render_with_mentions(post, render_post)
+        post.save()
+        ivan_url = reverse('posts:profile', args=('ivan',))
+        self.assertIn(f'<a href="{ivan_url}">@ivan</a>', post.text_html)
+        self.assertIn('>@anna.k</a>.', post.text_html)
+        self.assertIn('@nobody &lt;b&gt;', post.text_html)
+        self.assertEqual(self.mentioned(post=post), {'ivan', 'anna.k'})
+
+    def test_edit_and_comments_update_mentions(self):
+        """Правка поста и скрытие комментария убирают упоминания."""
+        post = Post.objects.create(text='@ivan @anna.k', author=self.author)
+        kept = Mention.objects.get(post=post, user=self.ivan)
+        self.author_client.post(
+            reverse('posts:post_edit', args=(post.id,)), {'text': '@ivan'})
+        self.assertEqual(self.mentioned(post=post), {'ivan'})
+        self.assertTrue(Mention.objects.filter(pk=kept.pk).exists())
+        comment = Comment.objects.create(
+            post=post, author=self.ivan, text='Спасибо, @anna.k')
+        self.assertEqual(self.mentioned(comment=comment), {'anna.k'})
+        comment.active = False
+        comment.save()
+        self.assertEqual(self.mentioned(comment=comment), set())
+
+    def test_mentions_page(self):
+        """На странице упоминаний посты, где упомянут пользователь."""
+        post = Post.objects.create(text='Для @ivan', author=self.author)
+        Post.objects.create(text='Ни для кого', author=self.author)
+        other = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=other, author=self.author, text='@ivan')
+        client = Client()
+        client.force_login(self.ivan)
+        response = self.assertWithinQueryBudget(
+            client, reverse('posts:mentions_index'))
+        self.assertEqual(list(response.context['page_obj']), [other, post])
+        self.assertTrue(response.context['page_obj'][0].in_comment)
+
+
+class ExcerptTest(TestCase):
+    def test_feed_shows_excerpt(self):
+        """Лента отдаёт выдержку, страница поста — весь текст."""
+        user = User.objects.create_user(username='auth')
+        text = 'слово ' * 100 + 'хвост'
+        post = Post.objects.create(text=text, author=user)
+        self.assertLess(len(post.excerpt_html), len(post.text_html))
+        self.assertTrue(post.excerpt_html.endswith('слово…</p>'))
+        feed = self.client.get(reverse('posts:index')).content.decode()
+        self.assertNotIn('хвост', feed)
+        detail = self.client.get(
+            reverse('posts:post_detail', args=(post.id,))).content.decode()
+        self.assertIn('хвост', detail)
+
+
+class LeanFeedTest(TestCase):
+    def test_feeds_load_card_fields_only(self):
+        """Ленты не грузят полный текст поста и пароль автора."""
+        user = User.objects.create_user(username='auth', password='secret')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Post.objects.create(text='Пост #тег', author=user, group=group)
+        Follow.objects.create(
+            user=User.objects.create_user(username='reader'), author=user)
+        reader = Client()
+        reader.force_login(User.objects.get(username='reader'))
+        pages = (
+            (self.client, reverse('posts:index')),
+            (self.client, reverse('posts:group_list', args=('group',))),
+            (self.client, reverse('posts:profile', args=('auth',))),
+            (self.client, reverse('posts:tag_list', args=('тег',))),
+            (reader, reverse('posts:follow_index')),
+        )
+        for client, url in pages:
+            with self.subTest(url=url):
+                post = client.get(url).context['page_obj'][0]
+                self.assertIn('text', post.get_deferred_fields())
+                self.assertIn('text_html', post.get_deferred_fields())
+                self.assertIn('password', post.author.get_deferred_fields())
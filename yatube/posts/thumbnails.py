@@ -0,0 +1,234 @@
+import os
+from collections import namedtuple
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.jobs import enqueue
+
+from .cache import bump_generations, post_scopes
+from .images import (VARIANT_RATIO, VARIANT_WIDTHS, image_metadata,
+                     make_variants, strip_metadata, variant_name)
+from .models import Post
+
+# Все миниатюры, которые выводят шаблоны ленты и поста.
+THUMBNAIL_GEOMETRIES = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+FEED_GEOMETRY = '960x339'
+THUMBNAIL_MISS_TIMEOUT = 60
+
+Thumbnail = namedtuple(
+    'Thumbnail',
+    'url width height srcset webp_srcset placeholder',
+    defaults=('', '', ''),
+)
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище ключей sorl с пакетным чтением.
+
+    Отсутствие миниатюры кэшируется на THUMBNAIL_MISS_TIMEOUT, а не на
+    срок кэша sorl: иначе готовую миниатюру не видно до его истечения.
+    """
+
+    def _get_raw(self, key):
+        value = self.cache.get(key)
+        if value is None:
+            found = dict(KVStoreModel.objects.filter(
+                key=key).values_list('key', 'value'))
+            self.remember(found, [key])
+            value = found.get(key)
+        if value is None or value == cached_db_kvstore.EMPTY_VALUE:
+            return None
+        return value
+
+    def get_many(self, image_files):
+        """Готовые миниатюры по ключам одним get_many к кэшу.
+
+        Промахи добираются из базы одним запросом и запоминаются в кэше,
+        в том числе отсутствующие.
+        """
+        keys = {add_prefix(image.key): image.key for image in image_files}
+        values = self.cache.get_many(list(keys))
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            self.remember(found, missing)
+            values.update(found)
+        return {
+            keys[key]: deserialize_image_file(value)
+            for key, value in values.items()
+            if value != cached_db_kvstore.EMPTY_VALUE
+        }
+
+    def remember(self, found, keys):
+        self.cache.set_many(found, settings.THUMBNAIL_CACHE_TIMEOUT)
+        self.cache.set_many(
+            {
+                key: cached_db_kvstore.EMPTY_VALUE
+                for key in keys if key not in found
+            },
+            THUMBNAIL_MISS_TIMEOUT,
+        )
+
+
+class QueuedThumbnailBackend(ThumbnailBackend):
+    """Отдаёт готовую миниатюру из хранилища ключей sorl.
+
+    Пока воркер её не сделал, возвращает оригинал картинки: в запросе
+    файл не открывается и не масштабируется.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        thumbnail = ImageFile(
+            self.thumbnail_name(source, geometry_string, options),
+            default.storage)
+        return default.kvstore.get(thumbnail) or source
+
+    def thumbnail_name(self, source, geometry_string, options):
+        """Имя файла миниатюры, как его считает ThumbnailBackend."""
+        options = dict(options)
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+
+def srcset(storage, name, extension):
+    return ', '.join(
+        f'{storage.url(variant_name(name, width, extension))} {width}w'
+        for width in VARIANT_WIDTHS
+    )
+
+
+def variants_thumbnail(post):
+    """Миниатюра из адаптивных копий: наборы srcset для JPEG и WebP."""
+    storage, name = post.image.storage, post.image.name
+    width = VARIANT_WIDTHS[-1]
+    return Thumbnail(
+        storage.url(variant_name(name, width, 'jpg')),
+        width,
+        round(width * VARIANT_RATIO),
+        srcset(storage, name, 'jpg'),
+        srcset(storage, name, 'webp'),
+        post.image_placeholder,
+    )
+
+
+def resolve_thumbnails(posts, geometry=FEED_GEOMETRY):
+    """Проставляет постам post.thumbnail одним запросом к хранилищу.
+
+    Пока миниатюры нет, отдаётся оригинал с размерами из полей поста:
+    файл картинки не открывается.
+    """
+    backend = QueuedThumbnailBackend()
+    options = THUMBNAIL_GEOMETRIES[geometry]
+    wanted = []
+    for post in posts:
+        post.thumbnail = None
+        if post.image and post.image_variants_ready and (
+            geometry == FEED_GEOMETRY
+        ):
+            post.thumbnail = variants_thumbnail(post)
+        elif post.image:
+            name = backend.thumbnail_name(
+                ImageFile(post.image), geometry, options)
+            wanted.append((post, ImageFile(name, default.storage)))
+    ready = default.kvstore.get_many(image for _, image in wanted)
+    for post, image in wanted:
+        cached = ready.get(image.key)
+        if cached is None:
+            post.thumbnail = Thumbnail(
+                post.image.url, post.image_width, post.image_height,
+                placeholder=post.image_placeholder)
+        else:
+            post.thumbnail = Thumbnail(
+                cached.url, cached.width, cached.height,
+                placeholder=post.image_placeholder)
+    return posts
+
+
+def generate_thumbnails(post_id):
+    """Задача воркера: делает все миниатюры картинки поста."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    backend = ThumbnailBackend()
+    for geometry, options in THUMBNAIL_GEOMETRIES.items():
+        backend.get_thumbnail(post.image, geometry, **options)
+
+
+def generate_variants(post_id):
+    """Задача воркера: делает адаптивные копии и превью картинки поста."""
+    post = Post.objects.select_related('author').filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    placeholder = make_variants(post.image.storage, post.image.name)
+    # update, а не save: сигналы поста не должны ставить задачи заново.
+    if Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        image_variants_ready=True, image_placeholder=placeholder,
+        updated=timezone.now(),
+    ):
+        # В кэше лежат страницы с картинкой без srcset и заглушки.
+        bump_generations(*post_scopes(post, {post.group_id}))
+
+
+def process_image(post_id):
+    """Задача воркера: убирает EXIF из новой картинки поста.
+
+    Перекодированный файл заменяет оригинал, затем ставятся в очередь
+    миниатюры и копии.
+    """
+    post = Post.objects.select_related('author').filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    storage, old_name = post.image.storage, post.image.name
+    with post.image.open('rb') as file_:
+        data = strip_metadata(file_)
+    if data is not None:
+        new_name = storage.save(
+            post.image.field.generate_filename(
+                post, os.path.basename(old_name)),
+            ContentFile(data))
+        if new_name != old_name:
+            if not Post.objects.filter(pk=post.pk, image=old_name).update(
+                image=new_name,
+                image_variants_ready=False,
+                image_placeholder='',
+                updated=timezone.now(),
+                **image_metadata(ContentFile(data)),
+            ):
+                return  # картинку уже заменили, у новой своя задача
+            if not Post.objects.filter(image=old_name).exists():
+                storage.delete(old_name)
+            post.image.name = new_name
+            bump_generations(*post_scopes(post, {post.group_id}))
+    schedule_thumbnails(post)
+
+
+def schedule_image_processing(post):
+    enqueue('posts.thumbnails.process_image', post_id=post.pk)
+
+
+def schedule_thumbnails(post):
+    enqueue('posts.thumbnails.generate_thumbnails', post_id=post.pk)
+    enqueue('posts.thumbnails.generate_variants', post_id=post.pk)
@@ -0,0 +1,39 @@
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+# Ограничение на один загружаемый файл и на тело запроса целиком.
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+MAX_BODY_SIZE = MAX_UPLOAD_SIZE + 1024 * 1024
+
+
+class SizeLimitUploadHandler(FileUploadHandler):
+    """Обрывает приём файла, как только он вышел за MAX_UPLOAD_SIZE.
+
+    Стоит первым в FILE_UPLOAD_HANDLERS и пропускает данные дальше по
+    цепочке. Остаток тела не дочитывается, имя поля попадает в
+    request.rejected_uploads, чтобы форма показала ошибку.
+    """
+    body_too_large = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        self.body_too_large = (content_length or 0) > MAX_BODY_SIZE
+        if self.request is not None:
+            self.request.rejected_uploads = set()
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        if self.body_too_large or (self.content_length or 0) > MAX_UPLOAD_SIZE:
+            self.reject()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > MAX_UPLOAD_SIZE:
+            self.reject()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def reject(self):
+        if self.request is not None:
+            self.request.rejected_uploads.add(self.field_name)
+        raise StopUpload(connection_reset=True)
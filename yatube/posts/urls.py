@@ -7,13 +7,24 @@ app_name = 'posts'
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path('tag/<str:name>/', views.tag_posts, name='tag_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('search/', views.post_search, name='post_search'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path(
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path(
+        'uploads/<str:token>/', views.upload_chunk, name='upload_chunk'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('mentions/', views.mentions_index, name='mentions_index'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -1,32 +1,96 @@
-from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods, require_POST
 
-from .models import Post, Group, Follow, User
+from core.queries import query_budget
+
+from .models import (ChunkedUpload, Comment, Post, Group, Follow, Tag,
+                     User)
+from .cache import cache_by_generation
+from .conditional import (conditional_page, group_state, index_state,
+                          post_state, profile_state)
+from .feed import card_entries, card_posts, pull_posts
 from .forms import CommentForm, PostForm
+from .paginator import KeysetPaginator, keyset_chunk
+from .resumable import (UploadError, content_length, discard_upload,
+                        receive_chunk, start_upload, take_upload)
+from .search import search
+from .thumbnails import resolve_thumbnails
 
 NUM_OF_POSTS = 10
+COMMENTS_PER_CHUNK = 20
+SEARCH_RESULTS = 20
 
 
 def paginator_new(request, post_list):  # Создал отдельную функцию
-    paginator = Paginator(post_list, NUM_OF_POSTS)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    paginator = KeysetPaginator(post_list, NUM_OF_POSTS)
+    return paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+
+def post_files(request):
+    """Файлы формы поста: готовая загрузка по upload_token вместо файла.
+
+    Взятая загрузка запоминается в request.used_upload, а неизвестный или
+    недокачанный токен попадает в request.rejected_uploads: пост не должен
+    молча сохраниться без картинки.
+    """
+    request.used_upload = None
+    token = request.POST.get('upload_token')
+    if token and 'image' not in request.FILES:
+        upload = take_upload(request.user, token)
+        if upload is None:
+            request.rejected_uploads = {
+                *getattr(request, 'rejected_uploads', ()), 'upload_token'}
+        else:
+            request.used_upload = upload
+            return {'image': upload}
+    return request.FILES or None
 
 
-@cache_page(20)
+def finish_upload(request, saved=False):
+    """Закрывает файл взятой загрузки, после сохранения поста удаляет её."""
+    upload = request.used_upload
+    if upload is None:
+        return
+    upload.close()
+    if saved:
+        discard_upload(request.user, upload.token)
+
+
+def post_detail_scopes(post_id):
+    scopes = [f'post:{post_id}']
+    post = Post.objects.filter(pk=post_id).values(
+        'author__username', 'group__slug').first()
+    if post:
+        scopes.append(f'author:{post["author__username"]}')
+        if post['group__slug']:
+            scopes.append(f'group:{post["group__slug"]}')
+    return scopes
+
+
+@conditional_page(index_state)
+@cache_by_generation(lambda: ['posts'])
+@query_budget(4)
 def index(request):
-    post_list = Post.objects.all()
+    post_list = card_posts(Post.objects.all())
     page_obj = paginator_new(request, post_list)
     context = {'page_obj': page_obj, }
     template = 'posts/index.html'
     return render(request, template, context)
 
 
+@conditional_page(group_state)
+@cache_by_generation(lambda slug: [f'group:{slug}'])
+@query_budget(5)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('author', 'group')
+    post_list = card_posts(group.posts.all())
     page_obj = paginator_new(request, post_list)
     template = 'posts/group_list.html'
     context = {
@@ -36,9 +100,26 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@query_budget(5)
+def tag_posts(request, name):
+    tag = get_object_or_404(Tag, name=name.lower())
+    entries = card_entries(tag.post_tags.all(), 'tag')
+    page_obj = paginator_new(request, entries)
+    page_obj.object_list = [entry.post for entry in page_obj.object_list]
+    context = {
+        'page_obj': page_obj,
+        'tag': tag,
+    }
+    return render(request, 'posts/tag_list.html', context)
+
+
+@conditional_page(profile_state)
+@cache_by_generation(lambda username: [f'author:{username}'])
+@query_budget(6)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group')
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    post_list = card_posts(author.posts.all())
     page_obj = paginator_new(request, post_list)
     following = request.user.is_authenticated and (
         Follow.objects.filter(
@@ -51,48 +132,102 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page(post_state)
+@cache_by_generation(post_detail_scopes)
+@query_budget(4)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
+    resolve_thumbnails([post])
+    comments, comments_cursor = keyset_chunk(
+        post.comments.filter(active=True).select_related('author'),
+        COMMENTS_PER_CHUNK,
+        key_field='created',
+    )
     form = CommentForm()
     template = 'posts/post_detail.html'
     context = {
         'post': post,
         'requser': request.user,
         'comments': comments,
+        'comments_cursor': comments_cursor,
         'form': form,
     }
     return render(request, template, context)
 
 
+@cache_by_generation(lambda post_id: [f'post:{post_id}'])
+@query_budget(3)
+def post_comments(request, post_id):
+    comments, comments_cursor = keyset_chunk(
+        Comment.objects.filter(
+            post_id=post_id, active=True).select_related('author'),
+        COMMENTS_PER_CHUNK,
+        after=request.GET.get('after'),
+        key_field='created',
+    )
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+        'comments_cursor': comments_cursor,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@query_budget(4)
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    hits, next_cursor = search(
+        query, SEARCH_RESULTS, after=request.GET.get('after'))
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        {hit.post_id for hit in hits})
+    results = [
+        (hit, posts[hit.post_id]) for hit in hits if hit.post_id in posts]
+    context = {
+        'query': query,
+        'results': results,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@query_budget(12)
 def post_create(request):
+    files = post_files(request)
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None,
+        files=files,
+        rejected_uploads=getattr(request, 'rejected_uploads', ()),
     )
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        finish_upload(request, saved=True)
         return redirect('posts:profile', post.author)
+    finish_upload(request)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
+@query_budget(12)
 def post_edit(request, post_id):
     select_post = get_object_or_404(Post, pk=post_id)
     if request.user != select_post.author:
         return redirect('posts:post_detail', post_id)
+    files = post_files(request)
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None,
+        files=files,
         instance=select_post,
+        rejected_uploads=getattr(request, 'rejected_uploads', ()),
     )
     if form.is_valid():
         form.save()
+        finish_upload(request, saved=True)
         return redirect('posts:post_detail', post_id)
-
+    finish_upload(request)
     context = {
         'form': form,
         'is_edit': True,
@@ -101,6 +236,57 @@ def post_edit(request, post_id):
 
 
 @login_required
+@require_POST
+@query_budget(3)
+def upload_start(request):
+    """Начинает загрузку по частям, отдаёт токен для следующих запросов."""
+    try:
+        upload = start_upload(
+            request.user,
+            request.POST.get('filename', ''),
+            int(request.POST.get('size', 0)),
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Нужен размер файла.'}, status=400)
+    except UploadError as error:
+        return JsonResponse({'error': str(error)}, status=error.status)
+    return JsonResponse({'token': upload.token, 'offset': 0}, status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+@query_budget(4)
+def upload_chunk(request, token):
+    """GET — сколько байт принято, PUT с Content-Range — следующая часть.
+
+    Часть читается из сети без транзакции: медленный клиент не держит
+    блокировку базы, а offset сдвигается только условным UPDATE.
+    """
+    upload = get_object_or_404(
+        ChunkedUpload, token=token, user=request.user)
+    if request.method == 'PUT':
+        try:
+            receive_chunk(
+                upload,
+                request.META.get('HTTP_CONTENT_RANGE'),
+                request,
+                content_length(request.META.get('CONTENT_LENGTH')),
+            )
+        except UploadError as error:
+            return JsonResponse(
+                {'error': str(error), 'offset': upload.offset},
+                status=error.status,
+            )
+    return JsonResponse({
+        'token': upload.token,
+        'offset': upload.offset,
+        'size': upload.size,
+        'complete': upload.complete,
+    })
+
+
+@login_required
+@query_budget(8)
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -108,20 +294,37 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@query_budget(8)
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user)
-    page_obj = paginator_new(request, posts)
+    pull_posts(request.user)
+    entries = card_entries(request.user.feed.all(), 'user')
+    page_obj = paginator_new(request, entries)
+    page_obj.object_list = [entry.post for entry in page_obj.object_list]
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@query_budget(5)
+def mentions_index(request):
+    entries = card_entries(
+        request.user.mentions.all(), 'user', 'comment')
+    page_obj = paginator_new(request, entries)
+    for entry in page_obj.object_list:
+        entry.post.in_comment = entry.comment_id is not None
+    page_obj.object_list = [entry.post for entry in page_obj.object_list]
+    context = {'page_obj': page_obj}
+    return render(request, 'posts/mentions.html', context)
+
+
+@login_required
+@query_budget(12)
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -130,6 +333,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@query_budget(9)
 def profile_unfollow(request, username):
     user_follower = get_object_or_404(
         Follow,
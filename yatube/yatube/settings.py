@@ -1,4 +1,5 @@
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -97,6 +98,11 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+# имена с хешем и сжатые копии .gz/.br пишутся при collectstatic;
+# при разработке статика отдаётся из исходников без манифеста
+if not DEBUG:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
 
 
 LOGIN_URL = 'users:login'
@@ -109,8 +115,36 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# кэш общий для всех процессов: сброс поколений в одном воркере виден
+# остальным, иначе страницы живут по PAGE_CACHE_TIMEOUT в каждом свой срок
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
+# тесты не должны видеть страницы из кэша разработчика и оставлять свои
+if sys.argv[1:2] == ['test'] or 'pytest' in sys.modules:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+
+# view с @query_budget падают при превышении бюджета вместо записи в лог
+QUERY_BUDGET_STRICT = False
+
+# миниатюры делает воркер run_jobs, в запросе отдаётся готовая или оригинал
+THUMBNAIL_BACKEND = 'posts.thumbnails.QueuedThumbnailBackend'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.KVStore'
+
+# первым стоит ограничитель размера, он обрывает приём больших файлов
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.SizeLimitUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# медиа отдаёт фронтовой сервер: префикс internal location для nginx
+# (X-Accel-Redirect) или True для Apache/lighttpd (X-Sendfile)
+MEDIA_ACCEL_REDIRECT = None
+MEDIA_X_SENDFILE = False
@@ -1,7 +1,10 @@
+import re
+
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.serving import serve_media, serve_static
 
 urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
@@ -11,10 +14,18 @@ urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
+urlpatterns += [
+    re_path(
+        r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+        serve_media,
+        name='media',
+    ),
+    re_path(
+        r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')),
+        serve_static,
+        name='static',
+    ),
+]
 
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'